@@ -0,0 +1,122 @@
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from users.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+PHOTOGRAPHER = 1
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+class PrefixIndex:
+    """
+    Sorted in-memory index of photographer username/first/last names for autocomplete.
+
+    `keys` holds the lower-cased names in sorted order and `pks` the matching user pks,
+    so a lookup is one bisect plus a scan of at most `limit` distinct users.
+    Each worker process keeps its own copy: it is built on first use (or by warm_up()
+    at startup), kept current by CustomUser signals in this process, and rebuilt in the
+    background every AUTOCOMPLETE_REFRESH_SECONDS to pick up other workers' changes.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.pks = []
+        self.names = {}
+        self.built_at = None
+        self.lock = threading.RLock()
+        self.rebuilding = False
+
+    @staticmethod
+    def name_keys(names):
+        return {name.lower() for name in names if name}
+
+    def build(self):
+        rows = CustomUser.objects.filter(user_type=PHOTOGRAPHER).values_list('pk', *NAME_FIELDS)
+        names = {row[0]: row[1:] for row in rows.iterator()}
+        entries = sorted((key, pk) for pk, fields in names.items() for key in self.name_keys(fields))
+        with self.lock:
+            self.keys = [key for key, _ in entries]
+            self.pks = [pk for _, pk in entries]
+            self.names = names
+            self.built_at = time.monotonic()
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self.lock:
+                if self.built_at is None:
+                    self.build()
+        elif time.monotonic() - self.built_at > getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 300):
+            self.rebuild_in_background()
+
+    def rebuild_in_background(self):
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+
+        def run():
+            try:
+                self.build()
+            except DatabaseError:
+                logger.exception('Rebuilding the autocomplete index failed')
+            finally:
+                self.rebuilding = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def remove(self, pk):
+        with self.lock:
+            for key in self.name_keys(self.names.pop(pk, ())):
+                i = bisect.bisect_left(self.keys, key)
+                while i < len(self.keys) and self.keys[i] == key:
+                    if self.pks[i] == pk:
+                        del self.keys[i]
+                        del self.pks[i]
+                        break
+                    i += 1
+
+    def update(self, user):
+        with self.lock:
+            if self.built_at is None:
+                return
+            self.remove(user.pk)
+            if user.user_type != PHOTOGRAPHER:
+                return
+            fields = tuple(getattr(user, field) for field in NAME_FIELDS)
+            self.names[user.pk] = fields
+            for key in self.name_keys(fields):
+                i = bisect.bisect_left(self.keys, key)
+                self.keys.insert(i, key)
+                self.pks.insert(i, user.pk)
+
+    def complete(self, prefix, limit=10):
+        prefix = prefix.lower()
+        results = []
+        seen = set()
+        with self.lock:
+            i = bisect.bisect_left(self.keys, prefix)
+            while i < len(self.keys) and len(results) < limit and self.keys[i].startswith(prefix):
+                pk = self.pks[i]
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append(dict(zip(NAME_FIELDS, self.names[pk])))
+                i += 1
+        return results
+
+
+index = PrefixIndex()
+
+
+def warm_up():
+    # Called once per worker at startup; a missing database just leaves it to the first request
+    try:
+        index.ensure_built()
+    except DatabaseError:
+        logger.warning('Autocomplete index not built at startup, it will be built on first use')
@@ -0,0 +1,152 @@
+import datetime
+
+from django.db.models import BigIntegerField, Case, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+
+from photographers.models import Photographer, PhotographerSlotPrice, TIME_CHOICES, avail_bit, day_bits
+from jobs.models import SlotOccupancy, SLOT_MASKS
+
+
+# Same order as datetime.date.weekday()
+WEEK_DAYS = ("MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY")
+
+# Bounds on a single availability request
+MAX_RANGE_DAYS = 92
+MAX_MATRIX_PHOTOGRAPHERS = 100
+
+
+def parse_search_date(value):
+    # Search dates come in as DD_MM_YYYY
+    try:
+        day, month, year = (int(x) for x in value.split('_'))
+        return datetime.date(year, month, day)
+    except ValueError:
+        raise serializers.ValidationError({'date': 'Date should be in DD_MM_YYYY format.'})
+
+
+def parse_date_range(params, start_name='date_from', end_name='date_to'):
+    # Inclusive DD_MM_YYYY range, at most MAX_RANGE_DAYS long
+    if params.get(start_name) is None or params.get(end_name) is None:
+        raise serializers.ValidationError('Both %s and %s are required.' % (start_name, end_name))
+    start = parse_search_date(params[start_name])
+    end = parse_search_date(params[end_name])
+    if end < start:
+        raise serializers.ValidationError('%s should not be before %s.' % (end_name, start_name))
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise serializers.ValidationError('The date range should be at most %d days.' % MAX_RANGE_DAYS)
+    return start, end
+
+
+def parse_search_dates(params):
+    # The dates of a multi-day search: ?dates=DD_MM_YYYY,DD_MM_YYYY,... or ?date_from=&date_to=
+    if params.get('dates'):
+        dates = sorted({parse_search_date(value) for value in params['dates'].split(',') if value})
+        if len(dates) > MAX_RANGE_DAYS:
+            raise serializers.ValidationError({'dates': 'At most %d dates per search.' % MAX_RANGE_DAYS})
+        return dates
+    if params.get('date_from') is not None or params.get('date_to') is not None:
+        return date_range(*parse_date_range(params))
+    return []
+
+
+def date_range(start, end):
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def weekday_name(date):
+    # Matches the keys of DAY_CHOICES (upper case, locale independent)
+    return WEEK_DAYS[date.weekday()]
+
+
+def free_slot_bits(weekday, occupied):
+    # The weekly availability bits of the slots on `weekday` that an occupied mask leaves free
+    return sum(avail_bit(weekday, slot) for slot, _ in TIME_CHOICES if not occupied & SLOT_MASKS[slot])
+
+
+def blocked_occupancy(dates, slot=None):
+    # SlotOccupancy rows on `dates` leaving the photographer unavailable that day: the requested
+    # `slot` overlaps what is booked or, without one, every slot they offer on that weekday does.
+    # The same overlap rule as the availability matrix and the calendar.
+    rows = SlotOccupancy.objects.filter(occupancy_date__in=list(dates), occupied_mask__gt=0)
+    if slot is not None:
+        return rows.annotate(slot_taken=F('occupied_mask').bitand(SLOT_MASKS.get(slot, 0))).filter(slot_taken__gt=0)
+    by_weekday = {}
+    for date in dates:
+        by_weekday.setdefault(weekday_name(date), []).append(date)
+    free_bits = Case(*[When(occupancy_date__in=weekday_dates, occupied_mask=occupied,
+                            then=Value(free_slot_bits(weekday, occupied)))
+                       for weekday, weekday_dates in sorted(by_weekday.items())
+                       for occupied in range(1, SLOT_MASKS['FULL_DAY_NIGHT'] + 1)],
+                     default=Value(0), output_field=BigIntegerField())
+    return rows.annotate(free_bits=F('photographer__photographer_avail_bits').bitand(free_bits)) \
+        .filter(free_bits=0)
+
+
+def with_avail_bits(queryset, name, mask):
+    # Photographers whose packed weekly availability shares a bit with `mask`,
+    # tested on the photographer row itself instead of joining photographer_avail_time
+    return queryset.annotate(**{name: F('photographer_avail_bits').bitand(mask)}).filter(**{name + '__gt': 0})
+
+
+def works_on(queryset, weekday):
+    return with_avail_bits(queryset, 'works_' + weekday.lower(), day_bits(weekday))
+
+
+def available_on(queryset, date, slot=None):
+    # Photographers who work on the weekday of `date` and are not blocked on it (see blocked_occupancy).
+    # The check is a correlated EXISTS subquery, so the outer query never grows with the number of bookings.
+    return works_on(queryset, weekday_name(date)).filter(
+        ~Exists(blocked_occupancy([date], slot).filter(photographer=OuterRef('pk'))))
+
+
+def available_on_dates(queryset, dates, match='all', slot=None):
+    # match='all': free on every date; match='any': free on at least one of them.
+    # Dates are grouped by weekday, so the query has at most 7 terms however long the range is.
+    by_weekday = {}
+    for date in dates:
+        by_weekday.setdefault(weekday_name(date), []).append(date)
+
+    if match == 'all':
+        for weekday in by_weekday:
+            queryset = works_on(queryset, weekday)
+        return queryset.filter(~Exists(blocked_occupancy(dates, slot).filter(photographer=OuterRef('pk'))))
+
+    # any: on some weekday the photographer works, fewer of its dates are blocked than searched
+    free_somewhere = Q(pk__in=[])
+    annotations = {}
+    for i, (weekday, weekday_dates) in enumerate(sorted(by_weekday.items())):
+        blocked_dates = blocked_occupancy(weekday_dates, slot).filter(photographer=OuterRef('pk')) \
+            .values('photographer').annotate(n=Count('pk')).values('n')
+        annotations['works_%d' % i] = F('photographer_avail_bits').bitand(day_bits(weekday))
+        annotations['booked_%d' % i] = Coalesce(Subquery(blocked_dates, output_field=IntegerField()), Value(0))
+        free_somewhere |= Q(**{'works_%d__gt' % i: 0, 'booked_%d__lt' % i: len(weekday_dates)})
+    return queryset.annotate(**annotations).filter(free_somewhere)
+
+
+def availability_matrix(usernames, start, end):
+    # {username: {date: {slot: 'FREE' | 'BOOKED'}}} for the slots each photographer offers
+    # on that weekday. Three queries whatever the number of photographers and days.
+    photographers = dict(Photographer.objects.filter(profile__user__username__in=usernames)
+                         .values_list('pk', 'profile__user__username'))
+
+    weekly = {}
+    for photographer_id, avail_date, avail_time in PhotographerSlotPrice.objects \
+            .filter(photographer__in=list(photographers)).values_list('photographer_id', 'avail_date', 'avail_time'):
+        weekly.setdefault((photographer_id, avail_date), set()).add(avail_time)
+
+    # a slot is BOOKED when it overlaps a booked one (FULL_DAY covers both half days), as in the calendar
+    booked = {(photographer_id, occupancy_date): mask for photographer_id, occupancy_date, mask in SlotOccupancy.objects
+              .filter(photographer__in=list(photographers), occupancy_date__range=(start, end), occupied_mask__gt=0)
+              .values_list('photographer_id', 'occupancy_date', 'occupied_mask')}
+
+    slot_order = [key for key, _ in TIME_CHOICES]
+    matrix = {}
+    for photographer_id, username in photographers.items():
+        days = matrix[username] = {}
+        for date in date_range(start, end):
+            offered = weekly.get((photographer_id, weekday_name(date)), ())
+            occupied = booked.get((photographer_id, date), 0)
+            days[date.isoformat()] = {slot: 'BOOKED' if occupied & SLOT_MASKS[slot] else 'FREE'
+                                      for slot in slot_order if slot in offered}
+    return matrix
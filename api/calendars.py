@@ -0,0 +1,152 @@
+import calendar as month_days
+import datetime
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import serializers
+
+from photographers.models import TIME_CHOICES, avail_bit
+from jobs.models import JobInfo, SlotOccupancy, SLOT_MASKS
+from .availability import date_range, weekday_name
+
+
+# Bounds on ?next_free=N
+MAX_NEXT_FREE = 50
+NEXT_FREE_HORIZON_DAYS = 180
+
+SLOT_ORDER = [key for key, _ in TIME_CHOICES]
+
+# Cached calendars are keyed by a per-photographer version, bumped by invalidate() on any booking
+# or availability change of that photographer (see api.signals and api.transitions)
+VERSION_KEY = 'calendar:version:%d'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PHOTOGRAPHER_CALENDAR_CACHE', 'default')]
+
+
+def _version(photographer_id):
+    cache = get_cache()
+    key = VERSION_KEY % photographer_id
+    value = cache.get(key)
+    if value is None:
+        # random start so a culled version key never comes back with an old value
+        cache.add(key, random.randint(1, 2 ** 31), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(photographer_ids):
+    cache = get_cache()
+    for photographer_id in set(photographer_ids):
+        try:
+            cache.incr(VERSION_KEY % photographer_id)
+        except ValueError:
+            pass
+
+
+def invalidate(photographer_ids):
+    # After commit, so no request can cache the old state in between
+    photographer_ids = [photographer_id for photographer_id in photographer_ids if photographer_id is not None]
+    if photographer_ids:
+        transaction.on_commit(lambda: _bump(photographer_ids))
+
+
+def parse_month(params, today=None):
+    # ?month=MM_YYYY, the current month by default
+    value = params.get('month')
+    if not value:
+        today = today or datetime.date.today()
+        return today.year, today.month
+    try:
+        month, year = (int(x) for x in value.split('_'))
+        datetime.date(year, month, 1)
+    except ValueError:
+        raise serializers.ValidationError({'month': 'Month should be in MM_YYYY format.'})
+    return year, month
+
+
+def parse_next_free(params):
+    try:
+        count = int(params['next_free'])
+    except ValueError:
+        raise serializers.ValidationError({'next_free': 'A valid integer is required.'})
+    if not 1 <= count <= MAX_NEXT_FREE:
+        raise serializers.ValidationError({'next_free': 'Should be between 1 and %d.' % MAX_NEXT_FREE})
+    return count
+
+
+def _offered(photographer, date):
+    weekday = weekday_name(date)
+    return [slot for slot in SLOT_ORDER if photographer.photographer_avail_bits & avail_bit(weekday, slot)]
+
+
+def month_calendar(photographer, year, month):
+    """
+    Every day of the month with the slots the photographer offers on its weekday, each 'BOOKED'
+    when it overlaps a booked job (SlotOccupancy), 'PENDING' when it overlaps a job request
+    awaiting an answer, otherwise 'FREE'. Two queries, cached until the photographer's next change.
+    """
+    cache = get_cache()
+    key = 'calendar:%d:%s:%04d-%02d' % (photographer.pk, _version(photographer.pk), year, month)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year, month, month_days.monthrange(year, month)[1])
+    booked = dict(SlotOccupancy.objects.filter(photographer=photographer, occupancy_date__range=(start, end))
+                  .values_list('occupancy_date', 'occupied_mask'))
+    pending = {}
+    for photoshoot_date, photoshoot_time in JobInfo.objects.filter(
+            job_photographer=photographer, job_status='PENDING', job_reservation__photoshoot_date__range=(start, end)) \
+            .values_list('job_reservation__photoshoot_date', 'job_reservation__photoshoot_time'):
+        pending[photoshoot_date] = pending.get(photoshoot_date, 0) | SLOT_MASKS[photoshoot_time]
+
+    days = []
+    for date in date_range(start, end):
+        slots = {}
+        for slot in _offered(photographer, date):
+            if booked.get(date, 0) & SLOT_MASKS[slot]:
+                slots[slot] = 'BOOKED'
+            elif pending.get(date, 0) & SLOT_MASKS[slot]:
+                slots[slot] = 'PENDING'
+            else:
+                slots[slot] = 'FREE'
+        days.append({'date': date.isoformat(), 'weekday': weekday_name(date), 'slots': slots})
+    data = {'month': '%04d-%02d' % (year, month), 'days': days}
+    cache.set(key, data)
+    return data
+
+
+def next_free(photographer, count, today=None):
+    """
+    The next `count` (date, slot) pairs from today on that the photographer offers and no booked
+    job overlaps, looking at most NEXT_FREE_HORIZON_DAYS ahead. One query, cached like the months.
+    """
+    today = today or datetime.date.today()
+    cache = get_cache()
+    key = 'calendar:%d:%s:next:%s:%d' % (photographer.pk, _version(photographer.pk), today.isoformat(), count)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    end = today + datetime.timedelta(days=NEXT_FREE_HORIZON_DAYS - 1)
+    booked = dict(SlotOccupancy.objects.filter(photographer=photographer, occupancy_date__range=(today, end),
+                                               occupied_mask__gt=0)
+                  .values_list('occupancy_date', 'occupied_mask'))
+    data = []
+    if photographer.photographer_avail_bits:
+        for date in date_range(today, end):
+            for slot in _offered(photographer, date):
+                if not booked.get(date, 0) & SLOT_MASKS[slot]:
+                    data.append({'date': date.isoformat(), 'slot': slot,
+                                 'price': photographer.slot_price(weekday_name(date), slot)})
+                    if len(data) == count:
+                        break
+            if len(data) == count:
+                break
+    cache.set(key, data)
+    return data
@@ -0,0 +1,114 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+# (serializer class, model, serializer plan_key) -> plan, see build_plan()
+_plans = {}
+
+
+def _nested(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.ManyRelatedField):
+        return field.child_relation
+    return field
+
+
+def _follow(attrs, field, model, path, select, prefetch):
+    # Walk one dotted source (e.g. 'job_customer.profile.user.username') through the models:
+    # to-one relations are joined, the first to-many relation is prefetched with its own plan
+    for i, attr in enumerate(attrs):
+        try:
+            relation = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # a property, method or annotation
+            return
+        if not relation.is_relation:
+            return
+        lookup = path + attr
+        rest = attrs[i + 1:]
+        if relation.many_to_many or relation.one_to_many:
+            if rest:
+                sub_select, sub_prefetch = set(), []
+                _follow(rest, field, relation.related_model, '', sub_select, sub_prefetch)
+                plan = (tuple(sorted(sub_select)), tuple(sub_prefetch))
+            elif isinstance(field, serializers.BaseSerializer):
+                plan = build_plan(type(field), relation.related_model, field)
+            elif getattr(field, 'related_source', None):
+                # a related field reading a dotted path of each related object
+                sub_select, sub_prefetch = set(), []
+                _follow(field.related_source.split('.'), None, relation.related_model, '', sub_select, sub_prefetch)
+                plan = (tuple(sorted(sub_select)), tuple(sub_prefetch))
+            else:
+                plan = ((), ())
+            prefetch.append((lookup, relation.related_model, plan))
+            return
+        if not rest and isinstance(field, serializers.PrimaryKeyRelatedField) and relation.concrete:
+            # DRF reads the primary key from the FK column without loading the row
+            return
+        select.add(lookup)
+        if not rest and isinstance(field, serializers.BaseSerializer):
+            sub_select, sub_prefetch = build_plan(type(field), relation.related_model, field)
+            select.update(lookup + '__' + name for name in sub_select)
+            prefetch.extend((lookup + '__' + name, related, plan) for name, related, plan in sub_prefetch)
+        path = lookup + '__'
+        model = relation.related_model
+
+
+def build_plan(serializer_class, model, serializer=None):
+    # (select_related paths, ((prefetch lookup, related model, nested plan), ...)) for serializing
+    # `model` rows with `serializer_class`, computed once per pair from the serializer's fields.
+    # Serializers whose fields vary per request expose a hashable `plan_key` describing them.
+    key = (serializer_class, model, getattr(serializer, 'plan_key', None))
+    if key not in _plans:
+        serializer = serializer if serializer is not None else serializer_class()
+        select, prefetch = set(), []
+        for field in serializer.fields.values():
+            if field.write_only or field.source == '*':
+                continue
+            _follow(field.source.split('.'), _nested(field), model, '', select, prefetch)
+        # drop paths already covered by a longer join
+        select = {path for path in select if not any(other.startswith(path + '__') for other in select)}
+        _plans[key] = (tuple(sorted(select)), tuple(prefetch))
+    return _plans[key]
+
+
+def _prefetches(prefetch):
+    # Fresh Prefetch objects on every use, Django adds prefixes to nested ones in place
+    return [Prefetch(lookup, queryset=apply_plan(related._default_manager.all(), plan))
+            for lookup, related, plan in prefetch]
+
+
+def apply_plan(queryset, plan):
+    select, prefetch = plan
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*_prefetches(prefetch))
+    return queryset
+
+
+def eager_load(queryset, serializer_class, serializer=None):
+    return apply_plan(queryset, build_plan(serializer_class, queryset.model, serializer))
+
+
+class EagerLoadingMixin:
+    """
+    Loads everything the view's serializer will read in a fixed number of queries:
+    to-one relations (nested serializers and dotted sources such as
+    'job_customer.profile.user.username') are joined with select_related, to-many
+    relations are prefetched, recursively with their own plan. Applied to list and
+    retrieve querysets only.
+    """
+    eager_load_actions = ('list', 'retrieve')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if getattr(self, 'action', None) in self.eager_load_actions:
+            serializer = self.get_serializer()
+            queryset = eager_load(queryset, type(serializer), serializer)
+            if not queryset.ordered:
+                # the joins would otherwise let the database pick another row order
+                queryset = queryset.order_by('pk')
+        return queryset
@@ -0,0 +1,241 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.response import Response
+
+
+# entry kinds of a compiled node
+VALUE, ATTRIBUTE, NESTED, MANY = range(4)
+
+# serializer class -> FastReader, or None when the serializer cannot be compiled
+_readers = {}
+
+
+class Unsupported(Exception):
+    # the serializer reads something that values() cannot reproduce (a property, a method,
+    # a slug or hyperlinked relation, a custom representation, ...)
+    pass
+
+
+def enabled():
+    return getattr(settings, 'FAST_READ_SERIALIZERS', False)
+
+
+def _identity(value):
+    return value
+
+
+class _Node:
+    # One serializer applied to the rows of one model, reading columns under `prefix`
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = prefix
+        self.pk_column = prefix + 'pk'
+        self.entries = []
+
+    def columns(self):
+        columns = [self.pk_column]
+        for entry in self.entries:
+            if entry[0] == VALUE:
+                columns.append(entry[2])
+            elif entry[0] == NESTED:
+                columns.extend(entry[2].columns())
+        return columns
+
+    def many(self):
+        # to-many relations of this node and of its nested to-one nodes
+        for entry in self.entries:
+            if entry[0] == NESTED:
+                yield from entry[2].many()
+            elif entry[0] == MANY:
+                yield entry[2]
+
+
+class _Many:
+    # A to-many relation loaded with one values() query for all parent rows
+    def __init__(self, relation, field, parent_column):
+        self.model = relation.related_model
+        # the lookup from the related model back to the parent, as used by prefetch_related
+        self.query_name = relation.related_query_name() if relation.concrete else relation.field.name
+        self.parent_column = parent_column
+        if isinstance(field, serializers.ListSerializer):
+            self.node = _compile(field.child, self.model)
+        elif isinstance(field, serializers.ManyRelatedField) and _is_pk_field(field.child_relation):
+            self.node = None
+        else:
+            raise Unsupported(field)
+        if self.query_name in self.columns()[1:]:
+            raise Unsupported(field)
+
+    def columns(self):
+        return [self.query_name] + (self.node.columns() if self.node is not None else ['pk'])
+
+    def load(self, parent_keys):
+        # {parent key: [representation, ...]} in the order the related rows come back
+        rows = list(self.model._default_manager.filter(**{self.query_name + '__in': parent_keys})
+                    .values(*self.columns()))
+        grouped = {}
+        if self.node is None:
+            for row in rows:
+                grouped.setdefault(row[self.query_name], []).append(row['pk'])
+            return grouped
+        for row, data in zip(rows, _render_rows(self.node, rows)):
+            grouped.setdefault(row[self.query_name], []).append(data)
+        return grouped
+
+
+def _is_pk_field(field):
+    return isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+
+
+def _missing_entry(key, field):
+    # DRF's Field.get_attribute on a missing attribute: None when nullable, skipped when optional
+    if field.default is not empty or field.required:
+        raise Unsupported(field)
+    if field.allow_null:
+        return (ATTRIBUTE, key, None, None, True)
+    return None
+
+
+def _compile_field(node, key, field):
+    model, path = node.model, node.prefix
+    attrs = field.source_attrs
+    for i, attr in enumerate(attrs):
+        last = i == len(attrs) - 1
+        try:
+            relation = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            if not last or hasattr(model, attr):
+                raise Unsupported(field)
+            entry = _missing_entry(key, field)
+            if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField, serializers.ManyRelatedField)):
+                # never an annotation, so always missing
+                if entry is not None:
+                    node.entries.append(entry)
+            elif path == '':
+                # an annotation when the queryset has one by that name
+                node.entries.append((ATTRIBUTE, key, attr, field.to_representation, entry is not None))
+            elif entry is not None:
+                node.entries.append(entry)
+            return
+        if not relation.is_relation:
+            if not last:
+                raise Unsupported(field)
+            node.entries.append((VALUE, key, path + attr, field.to_representation))
+            return
+        if relation.many_to_many or relation.one_to_many:
+            if not last:
+                raise Unsupported(field)
+            node.entries.append((MANY, key, _Many(relation, field, node.pk_column)))
+            return
+        if not relation.concrete:
+            # reverse one-to-one, DRF raises when the row is missing
+            raise Unsupported(field)
+        if last:
+            if isinstance(field, serializers.BaseSerializer):
+                node.entries.append((NESTED, key, _compile(field, relation.related_model, path + attr + '__')))
+            elif _is_pk_field(field):
+                node.entries.append((VALUE, key, path + attr, _identity))
+            else:
+                raise Unsupported(field)
+            return
+        path = path + attr + '__'
+        model = relation.related_model
+
+
+def _compile(serializer, model, prefix=''):
+    node = _Node(model, prefix)
+    for key, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            raise Unsupported(field)
+        _compile_field(node, key, field)
+    return node
+
+
+def _render(node, row, children):
+    data = OrderedDict()
+    for entry in node.entries:
+        kind, key = entry[0], entry[1]
+        if kind == VALUE:
+            value = row[entry[2]]
+            data[key] = None if value is None else entry[3](value)
+        elif kind == ATTRIBUTE:
+            column, represent, missing_is_null = entry[2], entry[3], entry[4]
+            if column is not None and column in row:
+                value = row[column]
+                data[key] = None if value is None else represent(value)
+            elif missing_is_null:
+                data[key] = None
+        elif kind == NESTED:
+            data[key] = None if row[entry[2].pk_column] is None else _render(entry[2], row, children)
+        else:
+            data[key] = children[entry[2]].get(row[entry[2].parent_column], [])
+    return data
+
+
+def _render_rows(node, rows):
+    children = {}
+    for many in node.many():
+        keys = {row[many.parent_column] for row in rows} - {None}
+        children[many] = many.load(keys) if keys else {}
+    return [_render(node, row, children) for row in rows]
+
+
+class FastReader:
+    """
+    Renders a read-only ModelSerializer from values() rows: to-one relations are joined into
+    the row, each to-many relation is one more values() query grouped by parent key. The
+    output matches serializer.data field for field, the representations come from the
+    serializer's own field objects.
+    """
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.root = _compile(serializer, self.model)
+
+    def values(self, queryset):
+        columns = self.root.columns()
+        columns.extend(entry[2] for entry in self.root.entries
+                       if entry[0] == ATTRIBUTE and entry[2] in queryset.query.annotations)
+        # values() ignores select_related, but prefetches would run on the dicts
+        return queryset.prefetch_related(None).values(*columns)
+
+    def render(self, rows):
+        return _render_rows(self.root, list(rows))
+
+
+def reader_for(serializer_class):
+    if serializer_class not in _readers:
+        try:
+            _readers[serializer_class] = FastReader(serializer_class())
+        except Unsupported:
+            _readers[serializer_class] = None
+    return _readers[serializer_class]
+
+
+class FastReadMixin:
+    # List through a FastReader when FAST_READ_SERIALIZERS is on and the serializer compiles
+
+    def get_fast_reader(self):
+        if not enabled():
+            return None
+        serializer = self.get_serializer()
+        if getattr(serializer, 'plan_key', None) is not None:
+            # ?fields= / ?expand= change the fields per request
+            return None
+        return reader_for(type(serializer))
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_fast_reader()
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(queryset))
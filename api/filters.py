@@ -0,0 +1,14 @@
+from rest_framework import filters
+
+from users.search import search_users
+
+
+class NameSearchFilter(filters.SearchFilter):
+    # SearchFilter over username/first/last name backed by the UserNameGram index.
+    # Views set `name_search_user_path` to the lookup path of the user, e.g. 'profile__user__'.
+
+    def filter_queryset(self, request, queryset, view):
+        user_path = getattr(view, 'name_search_user_path', '')
+        for term in self.get_search_terms(request):
+            queryset = search_users(queryset, term, user_path)
+        return queryset
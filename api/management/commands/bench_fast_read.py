@@ -0,0 +1,120 @@
+import datetime
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from api import searchcache
+from api.views import PhotographerViewSet, GetjobsViewSet, NotificationViewSet, PhotographerSearchViewSet
+from customers.models import Customer
+from jobs.models import JobInfo, JobReservation
+from notification.models import Notification
+from photographers.models import Photographer, PhotographerPriceStats, AvailTime, Equipment, Photo, Style, \
+    DAY_CHOICES, TIME_CHOICES, STYLE_CHOICES
+from users.models import CustomUser, CustomUserProfile
+
+
+ENDPOINTS = (
+    ('/api/photographers/', PhotographerViewSet),
+    ('/api/getjobs/', GetjobsViewSet),
+    ('/api/notification/', NotificationViewSet),
+    ('/api/photographersearch/?page_size=100', PhotographerSearchViewSet),
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the ModelSerializer and FAST_READ_SERIALIZERS list paths on the hot list endpoints ' \
+           'and check that both render the same bytes. All generated rows are rolled back at the end.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photographers', type=int, default=300)
+        parser.add_argument('--jobs', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            # APIRequestFactory requests come from 'testserver', which the search cache key reads
+            with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']), transaction.atomic():
+                self.run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def run(self, options):
+        self.seed(options['photographers'], options['jobs'])
+        factory = APIRequestFactory()
+        self.stdout.write('%-40s %7s %7s %9s %9s %8s  %s' % ('endpoint', 'queries', 'fast q', 'ms', 'fast ms',
+                                                               'speedup', 'output'))
+        for url, viewset in ENDPOINTS:
+            view = viewset.as_view({'get': 'list'})
+            slow, slow_queries, slow_body = self.measure(view, factory, url, options['repeat'], False)
+            fast, fast_queries, fast_body = self.measure(view, factory, url, options['repeat'], True)
+            self.stdout.write('%-40s %7d %7d %9.1f %9.1f %7.1fx  %s' % (
+                url, slow_queries, fast_queries, slow, fast, slow / fast,
+                'same' if slow_body == fast_body else 'DIFFERENT'))
+
+    def measure(self, view, factory, url, repeat, fast):
+        # best of `repeat` runs, with the search result cache emptied before each one
+        timings = []
+        with override_settings(FAST_READ_SERIALIZERS=fast):
+            for _ in range(repeat):
+                searchcache.get_cache().clear()
+                # the seeded rows fill the bounded debug query log, which would make the count 0
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = view(factory.get(url))
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+        return min(timings), len(queries), response.content
+
+    def seed(self, photographer_count, job_count):
+        CustomUser.objects.bulk_create(
+            [CustomUser(username='bench_photographer_%d' % i, user_type=1, password='!', email='p%d@bench' % i)
+             for i in range(photographer_count)] +
+            [CustomUser(username='bench_customer_%d' % i, user_type=2, password='!') for i in range(20)])
+        # bulk_create does not return primary keys on MySQL, so read the users back
+        users = list(CustomUser.objects.filter(username__startswith='bench_'))
+        CustomUserProfile.objects.bulk_create([CustomUserProfile(user=user) for user in users])
+        Photographer.objects.bulk_create([Photographer(profile_id=user.pk) for user in users if user.user_type == 1])
+        Customer.objects.bulk_create([Customer(profile_id=user.pk) for user in users if user.user_type == 2])
+        photographers = list(Photographer.objects.filter(profile__user__username__startswith='bench_'))
+        customers = list(Customer.objects.filter(profile__user__username__startswith='bench_'))
+
+        slots = [AvailTime.objects.create(avail_date=day, avail_time=slot, photographer_price=500 + 100 * i)
+                 for i, ((day, _), (slot, _)) in enumerate((day, slot) for day in DAY_CHOICES for slot in TIME_CHOICES)]
+        styles = [Style.objects.get_or_create(style_name=name)[0] for name, _ in STYLE_CHOICES]
+        Equipment.objects.bulk_create([Equipment(equipment_name='bench camera %d' % i) for i in range(20)],
+                                      ignore_conflicts=True)
+        equipment = list(Equipment.objects.filter(equipment_name__startswith='bench camera '))
+        Photo.objects.bulk_create([Photo(photo_link='http://bench/%d/%d' % (photographer.pk, i))
+                                   for photographer in photographers for i in range(5)])
+        for photographer in photographers:
+            photographer.photographer_avail_time.add(*random.sample(slots, 6))
+            photographer.photographer_style.add(*random.sample(styles, 2))
+            photographer.photographer_equipment.add(*random.sample(equipment, 3))
+            photographer.photographer_photos.add(*['http://bench/%d/%d' % (photographer.pk, i) for i in range(5)])
+        PhotographerPriceStats.refresh([photographer.pk for photographer in photographers])
+        for customer in customers:
+            customer.fav_photographers.add(*random.sample(photographers, min(5, len(photographers))))
+
+        date = datetime.date.today() + datetime.timedelta(days=30)
+        for i in range(job_count):
+            photographer, customer, slot = random.choice(photographers), random.choice(customers), random.choice(slots)
+            reservation = JobReservation.objects.create(photoshoot_date=date, photoshoot_time=slot.avail_time,
+                                                        job_avail_time=slot)
+            job = JobInfo.objects.create(job_title='bench %d' % i, job_customer=customer, job_photographer=photographer,
+                                         job_status='PENDING', job_style='NONE', job_location='bench',
+                                         job_expected_complete_date=date)
+            job.job_reservation.add(reservation)
+            Notification.objects.create(noti_job_id=job.pk, noti_receiver=photographer.profile,
+                                        noti_actor=customer.profile, noti_action='CREATE', noti_status='PENDING')
@@ -0,0 +1,93 @@
+import datetime
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from api import searchcache
+from api.views import PhotographerSearchViewSet
+from customers.models import Customer
+from jobs.models import JobInfo, JobReservation
+from photographers.models import Photographer, PhotographerPriceStats, AvailTime, DAY_CHOICES, TIME_CHOICES
+from users.models import CustomUser, CustomUserProfile
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time /api/photographersearch?date= while the number of bookings on that date grows. ' \
+           'All generated rows are rolled back at the end.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photographers', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, nargs='+', default=[0, 100, 500, 1000, 2000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            # APIRequestFactory requests come from 'testserver', which the search cache key reads
+            with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']), transaction.atomic():
+                self.run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def run(self, options):
+        date = datetime.date.today() + datetime.timedelta(days=30)
+        photographers, customer = self.seed_people(options['photographers'])
+        slots = [AvailTime.objects.create(avail_date=day, avail_time=slot, photographer_price=1000)
+                 for day, _ in DAY_CHOICES for slot, _ in TIME_CHOICES]
+        for photographer in photographers:
+            photographer.photographer_avail_time.add(*random.sample(slots, 5))
+        PhotographerPriceStats.refresh([photographer.pk for photographer in photographers])
+
+        view = PhotographerSearchViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        url = '/api/photographersearch/?date=' + date.strftime('%d_%m_%Y')
+        booked = 0
+        self.stdout.write('bookings   queries   best ms   mean ms')
+        for target in sorted(options['bookings']):
+            booked = self.book(photographers, customer, date, booked, target)
+            timings = []
+            for _ in range(options['repeat']):
+                # time the query, not the search result cache
+                searchcache.get_cache().clear()
+                # the seeded rows fill the bounded debug query log, which would make the count 0
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = view(factory.get(url))
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write('%8d %9d %9.1f %9.1f' % (booked, len(queries), min(timings),
+                                                       sum(timings) / len(timings)))
+
+    def seed_people(self, count):
+        CustomUser.objects.bulk_create(
+            [CustomUser(username='bench_photographer_%d' % i, user_type=1, password='!') for i in range(count)] +
+            [CustomUser(username='bench_customer', user_type=2, password='!')])
+        # bulk_create does not return primary keys on MySQL, so read the users back
+        users = CustomUser.objects.filter(username__startswith='bench_')
+        CustomUserProfile.objects.bulk_create([CustomUserProfile(user=user) for user in users])
+        customer = Customer.objects.create(profile_id=users.get(username='bench_customer').pk)
+        photographers = Photographer.objects.bulk_create(
+            [Photographer(profile_id=user.pk) for user in users if user.user_type == 1])
+        return photographers, customer
+
+    def book(self, photographers, customer, date, booked, target):
+        slot = AvailTime.objects.first()
+        for photographer in photographers[booked:target]:
+            reservation = JobReservation.objects.create(photoshoot_date=date, photoshoot_time=slot.avail_time,
+                                                        job_avail_time=slot)
+            job = JobInfo.objects.create(job_title='bench', job_customer=customer, job_photographer=photographer,
+                                         job_status='MATCHED', job_style='NONE', job_location='bench',
+                                         job_expected_complete_date=date)
+            job.job_reservation.add(reservation)
+        return max(booked, min(target, len(photographers)))
@@ -0,0 +1,63 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.transitions import JOB_COLUMNS, TransitionConflict, apply_transitions
+from jobs.models import JobInfo, EXPIRABLE_JOB_STATUSES
+
+
+class Command(BaseCommand):
+    help = 'Move PENDING and MATCHED jobs whose photoshoot dates have all passed to EXPIRED, one chunk of jobs ' \
+           'at a time, notifying the customers. Meant to run daily from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--date', help='Expire jobs whose last photoshoot date is before this day (YYYY-MM-DD), '
+                                           'today by default')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the jobs that would expire')
+
+    def handle(self, *args, **options):
+        try:
+            cutoff = datetime.datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] \
+                else datetime.date.today()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+        # reservation dates are indexed: jobs with a past reservation and no current or future one
+        expired = JobInfo.objects.filter(job_status__in=EXPIRABLE_JOB_STATUSES,
+                                         job_reservation__photoshoot_date__lt=cutoff) \
+            .exclude(job_reservation__photoshoot_date__gte=cutoff).order_by('pk').distinct()
+
+        start = time.perf_counter()
+        if options['dry_run']:
+            self.stdout.write('%d jobs would expire' % expired.count())
+            return
+
+        last_pk = None
+        processed = skipped = 0
+        while True:
+            chunk = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+            jobs = {row['pk']: row for row in chunk.values(*JOB_COLUMNS)[:options['chunk_size']]}
+            if not jobs:
+                break
+            last_pk = max(jobs)
+            expired_now, skipped_now = self.expire(jobs)
+            processed += expired_now
+            skipped += skipped_now
+            if options['verbosity'] >= 2:
+                self.stdout.write('Expired %d jobs' % processed)
+        self.stdout.write('Expired %d jobs (%d skipped) in %.2fs' % (processed, skipped, time.perf_counter() - start))
+
+    def expire(self, jobs):
+        # Expire a chunk, retrying without the jobs a conflict names so only those are skipped
+        skipped = []
+        while jobs:
+            try:
+                return apply_transitions(jobs, {job_id: 'EXPIRED' for job_id in jobs}), len(skipped)
+            except TransitionConflict as conflict:
+                # changed by a user meanwhile, the next run sees the new status
+                conflicting = [job_id for job_id in conflict.job_ids if job_id in jobs] or list(jobs)
+                self.stderr.write('Skipped jobs changed during expiry: %s' % conflicting)
+                skipped += conflicting
+                jobs = {job_id: job for job_id, job in jobs.items() if job_id not in conflicting}
+        return 0, len(skipped)
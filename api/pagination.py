@@ -0,0 +1,112 @@
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    # Full precision, unlike DjangoJSONEncoder which drops microseconds
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+class PhotographerSearchCursorPagination(pagination.BasePagination):
+    """
+    Keyset pagination over whatever ordering the view put on the queryset.
+
+    The ordering must end in a unique field (the search view always appends 'pk'),
+    and every ordering field must be readable from the row, i.e. a model field or
+    an annotation. NULLs are assumed to sort lowest, as they do on MySQL and SQLite.
+    No COUNT(*) is run; ?estimate=true adds a count capped at `estimate_limit`.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    estimate_query_param = 'estimate'
+    estimate_limit = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = list(queryset.query.order_by)
+
+        self.estimated_total = None
+        position = self.decode_cursor(request, ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        elif request.query_params.get(self.estimate_query_param) in ('1', 'true'):
+            self.estimated_total = queryset.order_by().values('pk')[:self.estimate_limit + 1].count()
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            self.next_position = [getattr(rows[-1], field.lstrip('-')) for field in ordering]
+        self.ordering = ordering
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def after(self, ordering, position):
+        # (a, b, pk) > (x, y, z) in the ordering's directions, written as
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            if field.startswith('-'):
+                # descending, NULLs last: anything smaller, then the NULLs
+                strictly = Q(pk__in=[]) if value is None else Q(**{name + '__lt': value}) | Q(**{name + '__isnull': True})
+            else:
+                # ascending, NULLs first: anything bigger, NULL is smallest
+                strictly = Q(**{name + '__isnull': False}) if value is None else Q(**{name + '__gt': value})
+            condition |= equal & strictly
+            equal &= Q(**{name + '__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, position):
+        data = json.dumps({'o': self.ordering, 'p': position}, default=_encode_value)
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = data['p']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor only makes sense for the sort it was issued for
+        if data.get('o') != ordering or len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        fields = [('next', self.get_next_link())]
+        if self.estimated_total is not None:
+            fields.append(('estimated_total', min(self.estimated_total, self.estimate_limit)))
+            fields.append(('estimated_total_capped', self.estimated_total > self.estimate_limit))
+        fields.append(('results', data))
+        return Response(OrderedDict(fields))
@@ -0,0 +1,235 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, Exists, ExpressionWrapper, F, FloatField, OuterRef, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers
+
+from photographers.models import Photographer, PhotographerPriceStats, PhotographerSlotPrice, PhotographerEquipmentIndex, \
+    DAY_CHOICES, STYLE_CHOICES, STYLE_INDEX, TIME_CHOICES, TIME_INDEX, equipment_key, pack_styles, time_bits
+from users.search import search_users
+from .availability import available_on, available_on_dates, parse_search_date, parse_search_dates, weekday_name, \
+    with_avail_bits
+
+
+# sort parameter -> (ordering, annotations the ordering needs)
+SEARCH_SORTS = {
+    'time_des': ('-photographer_last_online_time', {}),
+    'time_asc': ('photographer_last_online_time', {}),
+    'price_des': ('-price', {'price': F('price_stats__price_avg')}),
+    'price_asc': ('price', {'price': F('price_stats__price_avg')}),
+    'review_des': ('-review_count', {'review_count': F('review_stats__review_count')}),
+    'review_asc': ('review_count', {'review_count': F('review_stats__review_count')}),
+}
+
+# sort=relevance: weighted sum of per-photographer features, each scaled to 0..1.
+# Weights can be overridden (per feature) with settings.PHOTOGRAPHER_RELEVANCE_WEIGHTS.
+RELEVANCE_WEIGHTS = {
+    'name': 4.0,      # exact name 1, name prefix 0.5, other match 0 (only with ?user=)
+    'rating': 2.0,    # average rating / 10
+    'reviews': 1.0,   # review count, RELEVANCE_REVIEW_HALF reviews score 0.5
+    'recency': 1.0,   # last online time, see RELEVANCE_RECENCY
+    'price': 1.0,     # average price inside ?min_price/?max_price (only with a budget)
+}
+RELEVANCE_REVIEW_HALF = 10
+# (online within this many days, score), best first; older or never online scores 0
+RELEVANCE_RECENCY = ((1, 1.0), (7, 0.6), (30, 0.3))
+
+# Upper bounds of the price facet buckets (on a photographer's average price); the last bucket is open
+PRICE_BUCKETS = (1000, 3000, 5000, 10000)
+
+
+def parse_price(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise serializers.ValidationError({name: 'A valid number is required.'})
+
+
+def parse_match(params, name):
+    match = params.get(name, 'all')
+    if match not in ('all', 'any'):
+        raise serializers.ValidationError({name: 'Should be "all" or "any".'})
+    return match
+
+
+def parse_list(params, name):
+    # ?name=a,b,c -> ['a', 'b', 'c']
+    return [value for value in params.get(name, '').split(',') if value]
+
+
+def with_styles(queryset, styles, match='all', name='style_match'):
+    # One test on the packed photographer_style_bits whatever the number of styles:
+    # all -> every bit of the mask set, any -> at least one
+    known = {style for style in styles if style in STYLE_INDEX}
+    if not known or (match == 'all' and len(known) < len(set(styles))):
+        return queryset.none()
+    mask = pack_styles(known)
+    queryset = queryset.annotate(**{name: F('photographer_style_bits').bitand(mask)})
+    return queryset.filter(**{name: mask} if match == 'all' else {name + '__gt': 0})
+
+
+def equipment_photographers(names, match='all'):
+    # Photographer ids from the equipment inverted index, one grouped query for any number of names
+    keys = {equipment_key(name) for name in names}
+    index = PhotographerEquipmentIndex.objects.filter(equipment_key__in=keys)
+    if match == 'all':
+        index = index.values('photographer').annotate(matched=Count('equipment_key')).filter(matched=len(keys))
+    return index.values('photographer')
+
+
+def within_budget(queryset, min_price=None, max_price=None, time=None, date=None):
+    # Photographers with at least one slot priced inside [min_price, max_price].
+    # When the search also pins a slot (time) or a day (date), that slot/day must be the one in budget.
+    prices = PhotographerSlotPrice.objects.filter(photographer=OuterRef('pk'))
+    if min_price is not None:
+        prices = prices.filter(photographer_price__gte=min_price)
+        queryset = queryset.filter(price_stats__price_max__gte=min_price)
+    if max_price is not None:
+        prices = prices.filter(photographer_price__lte=max_price)
+        queryset = queryset.filter(price_stats__price_min__lte=max_price)
+    if time is not None:
+        prices = prices.filter(avail_time=time)
+    if date is not None:
+        prices = prices.filter(avail_date=weekday_name(date))
+    return queryset.filter(Exists(prices))
+
+
+def filter_photographers(params):
+    # Apply the /api/photographersearch filters found in `params` (request.query_params).
+    # Shared by the search list and its facets so both always agree.
+
+    #Filter name
+    user = params.get('user')
+    if user is not None :
+        nameset = search_users(Photographer.objects.all(), user, 'profile__user__')
+    else : nameset = Photographer.objects.all()
+
+    #Filter other parameters
+    style = params.get('style')
+    time = params.get('time')
+    date = params.get('date')
+    date = parse_search_date(date) if date is not None else None
+    paraset = nameset
+    if style is not None :
+        paraset = with_styles(paraset, [style])
+    if time is not None :
+        # A bit test on the packed weekly availability (the slot on any day), no join
+        paraset = with_avail_bits(paraset, 'works_time', time_bits(time)) if time in TIME_INDEX else paraset.none()
+
+    #Filter several styles / equipment (?styles=a,b&styles_match=any, ?equipment=x,y&equipment_match=all)
+    styles = parse_list(params, 'styles')
+    if styles :
+        paraset = with_styles(paraset, styles, parse_match(params, 'styles_match'), name='styles_match')
+    equipment = parse_list(params, 'equipment')
+    if equipment :
+        paraset = paraset.filter(pk__in=equipment_photographers(equipment, parse_match(params, 'equipment_match')))
+
+    #Filter budget (some slot priced inside [min_price, max_price], on the searched slot/day if given)
+    min_price = parse_price(params, 'min_price')
+    max_price = parse_price(params, 'max_price')
+    if min_price is not None or max_price is not None :
+        paraset = within_budget(paraset, min_price, max_price, time=time, date=date)
+
+    #Filter Date (photographers working on that weekday with the searched slot, or some offered slot, free that date)
+    if date is not None :
+        paraset = available_on(paraset, date, time)
+
+    #Filter several dates (?dates= or ?date_from=&date_to=), free on all of them or on any one
+    dates = parse_search_dates(params)
+    if dates :
+        paraset = available_on_dates(paraset, dates, parse_match(params, 'date_match'), time)
+    return paraset
+
+
+def relevance_weights():
+    weights = dict(RELEVANCE_WEIGHTS)
+    weights.update(getattr(settings, 'PHOTOGRAPHER_RELEVANCE_WEIGHTS', {}))
+    return weights
+
+
+def relevance_score(params, now=None):
+    # sort=relevance as one SQL expression over the name rank, review stats, last online time
+    # and price stats columns, so the database scores every candidate in the same pass
+    now = now or timezone.now()
+    user = params.get('user')
+    min_price = parse_price(params, 'min_price')
+    max_price = parse_price(params, 'max_price')
+
+    features = {
+        'rating': Coalesce(F('review_stats__review_avg'), Value(0.0)) / Value(10.0),
+        'reviews': Coalesce(F('review_stats__review_count'), Value(0)) * Value(1.0)
+                   / (Coalesce(F('review_stats__review_count'), Value(0)) + Value(RELEVANCE_REVIEW_HALF)),
+        'recency': Case(*[When(photographer_last_online_time__gte=now - datetime.timedelta(days=days), then=Value(score))
+                          for days, score in RELEVANCE_RECENCY],
+                        default=Value(0.0), output_field=FloatField()),
+    }
+    if user is not None and user.strip() :
+        features['name'] = F('name_rank') / Value(2.0)
+    if min_price is not None or max_price is not None :
+        budget = Q(price_stats__price_avg__isnull=False)
+        if min_price is not None :
+            budget &= Q(price_stats__price_avg__gte=min_price)
+        if max_price is not None :
+            budget &= Q(price_stats__price_avg__lte=max_price)
+        features['price'] = Case(When(budget, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+
+    score = Value(0.0)
+    for name, weight in sorted(relevance_weights().items()):
+        if weight and name in features :
+            score = score + Value(float(weight)) * features[name]
+    return ExpressionWrapper(score, output_field=FloatField())
+
+
+def sort_photographers(queryset, params):
+    # pk breaks ties so pages and cursors are stable
+    sort = params.get('sort')
+    if sort == 'relevance' :
+        return queryset.annotate(relevance=relevance_score(params)).order_by('-relevance', 'pk')
+    elif sort in SEARCH_SORTS :
+        ordering, annotations = SEARCH_SORTS[sort]
+        return queryset.annotate(**annotations).order_by(ordering, 'pk')
+    elif params.get('user') is not None :
+        return queryset.order_by('-name_rank', 'pk')
+    return queryset.order_by('pk')
+
+
+def price_bucket_label(index):
+    if index == len(PRICE_BUCKETS):
+        return '%d+' % PRICE_BUCKETS[-1]
+    return '%d-%d' % (PRICE_BUCKETS[index - 1] if index else 0, PRICE_BUCKETS[index])
+
+
+def facet_counts(queryset):
+    # Number of photographers in `queryset` per style, time slot, weekday and price bucket,
+    # one GROUP BY query per facet over the matching photographer ids.
+    matching = queryset.order_by().values('pk')
+    StyleThrough = Photographer.photographer_style.through
+
+    styles = StyleThrough.objects.filter(photographer_id__in=matching) \
+        .values('style_id').annotate(count=Count('photographer_id', distinct=True)).order_by()
+    slots = PhotographerSlotPrice.objects.filter(photographer_id__in=matching) \
+        .values('avail_time').annotate(count=Count('photographer_id', distinct=True)).order_by()
+    days = PhotographerSlotPrice.objects.filter(photographer_id__in=matching) \
+        .values('avail_date').annotate(count=Count('photographer_id', distinct=True)).order_by()
+    bucket = Case(*[When(price_avg__lt=bound, then=Value(price_bucket_label(i)))
+                    for i, bound in enumerate(PRICE_BUCKETS)],
+                  default=Value(price_bucket_label(len(PRICE_BUCKETS))), output_field=CharField())
+    prices = PhotographerPriceStats.objects.filter(photographer_id__in=matching, price_avg__isnull=False) \
+        .annotate(bucket=bucket).values('bucket').annotate(count=Count('pk')).order_by()
+
+    style_counts = {row['style_id']: row['count'] for row in styles}
+    slot_counts = {row['avail_time']: row['count'] for row in slots}
+    day_counts = {row['avail_date']: row['count'] for row in days}
+    price_counts = {row['bucket']: row['count'] for row in prices}
+    return {
+        'styles': {key: style_counts.get(key, 0) for key, _ in STYLE_CHOICES},
+        'times': {key: slot_counts.get(key, 0) for key, _ in TIME_CHOICES},
+        'days': {key: day_counts.get(key, 0) for key, _ in DAY_CHOICES},
+        'prices': {price_bucket_label(i): price_counts.get(price_bucket_label(i), 0)
+                   for i in range(len(PRICE_BUCKETS) + 1)},
+    }
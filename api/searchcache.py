@@ -0,0 +1,74 @@
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Cached /api/photographersearch responses are keyed by a generation number.
+# Any change that can alter search results bumps the generation (see api.signals),
+# which orphans every cached page at once; the cache's own TTL/LRU culling clears them.
+GENERATION_KEY = 'photographersearch:generation'
+HITS_KEY = 'photographersearch:hits'
+MISSES_KEY = 'photographersearch:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PHOTOGRAPHER_SEARCH_CACHE', 'default')]
+
+
+def _fresh_generation():
+    # Random start so a culled generation key never comes back with an old value
+    return random.randint(1, 2 ** 31)
+
+
+def generation():
+    cache = get_cache()
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, _fresh_generation(), timeout=None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def bump_generation():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, _fresh_generation(), timeout=None)
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def record_hit():
+    _count(HITS_KEY)
+
+
+def record_miss():
+    _count(MISSES_KEY)
+
+
+def stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    return {'hits': hits, 'misses': misses, 'generation': cache.get(GENERATION_KEY)}
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def cache_key(request):
+    # Normalized query: parameter and value order do not matter.
+    # The host is part of the key because cached pages carry absolute next/previous links.
+    params = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    digest = hashlib.md5(repr((request.get_host(), request.path, params)).encode('utf-8')).hexdigest()
+    return 'photographersearch:%s:%s' % (generation(), digest)
@@ -5,16 +5,21 @@ from djoser.serializers import UserCreateSerializer as BaseUserRegistrationSeria
 from rest_framework.validators import UniqueValidator
 from drf_writable_nested.serializers import WritableNestedModelSerializer
 from drf_writable_nested.mixins import UniqueFieldsMixin, NestedUpdateMixin
+from django.db import transaction
 from django.db.models import Q, Sum
 # Import App Models
-from photographers.models import Photographer, Photo, AvailTime, Equipment, Style
+from photographers.models import Photographer, Photo, AvailTime, Equipment, Style, PhotographerPriceStats, \
+    PhotographerEquipmentIndex, DAY_INDEX, TIME_INDEX, pack_availability, pack_styles
 from customers.models import Customer
-from jobs.models import JobInfo, JobReservation
+from jobs.models import JobInfo, JobReservation, SlotOccupancy, SLOT_MASKS, JOB_STATUS_CHOICES, transition_error
 from users.models import CustomUser, CustomUserProfile
 from notification.models import Notification
 from reviews.models import ReviewInfo
 from payments.models import Payment
 import datetime
+from .sparse import SparseFieldsSerializerMixin
+from .transitions import TransitionConflict, apply_transitions, load_jobs, transition_errors
+from . import calendars, searchcache, vectorsearch
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -134,6 +139,81 @@ class EquipmentSerializer(UniqueFieldsMixin,NestedUpdateMixin,serializers.ModelS
         }
 
 
+def get_or_create_by_pk(model, pks):
+    # {pk: instance} for rows keyed by a natural primary key (photo link, equipment name):
+    # one IN query for the existing rows and one bulk insert for the missing ones
+    pks = list(dict.fromkeys(pks))
+    found = model.objects.in_bulk(pks)
+    missing = [model(pk=pk) for pk in pks if pk not in found]
+    model.objects.bulk_create(missing, ignore_conflicts=True)
+    found.update((instance.pk, instance) for instance in missing)
+    return found
+
+
+def get_or_create_avail_times(slots):
+    # {(avail_date, avail_time, photographer_price): AvailTime} for the shared AvailTime rows,
+    # reusing the oldest row of each slot and bulk creating the missing ones
+    slots = list(dict.fromkeys(slots))
+    if not slots:
+        return {}
+    def lookup():
+        condition = Q()
+        for avail_date, avail_time, price in slots:
+            condition |= Q(avail_date=avail_date, avail_time=avail_time, photographer_price=price)
+        found = {}
+        for avail_time_instance in AvailTime.objects.filter(condition).order_by('-pk'):
+            found[(avail_time_instance.avail_date, avail_time_instance.avail_time,
+                   avail_time_instance.photographer_price)] = avail_time_instance
+        return found
+    found = lookup()
+    missing = [slot for slot in slots if slot not in found]
+    if missing:
+        AvailTime.objects.bulk_create([AvailTime(avail_date=avail_date, avail_time=avail_time, photographer_price=price)
+                                       for avail_date, avail_time, price in missing])
+        # bulk_create does not return primary keys on MySQL, so read them back
+        found = lookup()
+    return found
+
+
+def get_or_create_reservations(keys):
+    # {(photoshoot_date, photoshoot_time, job_avail_time_id): JobReservation} in the order of `keys`,
+    # reusing the oldest matching reservation and bulk creating the missing ones
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    def lookup():
+        condition = Q()
+        for photoshoot_date, photoshoot_time, avail_time_id in keys:
+            condition |= Q(photoshoot_date=photoshoot_date, photoshoot_time=photoshoot_time, job_avail_time_id=avail_time_id)
+        found = {}
+        for reservation in JobReservation.objects.filter(condition).order_by('-pk'):
+            found[(reservation.photoshoot_date, reservation.photoshoot_time, reservation.job_avail_time_id)] = reservation
+        return found
+    found = lookup()
+    missing = [key for key in keys if key not in found]
+    if missing:
+        JobReservation.objects.bulk_create([JobReservation(photoshoot_date=photoshoot_date, photoshoot_time=photoshoot_time,
+                                                           job_avail_time_id=avail_time_id)
+                                            for photoshoot_date, photoshoot_time, avail_time_id in missing])
+        # bulk_create does not return primary keys on MySQL, so read them back
+        found = lookup()
+    return {key: found[key] for key in keys}
+
+
+def sync_m2m(manager, instances):
+    # Make the relation hold exactly `instances`, writing only the rows that change.
+    # Returns whether anything changed.
+    wanted = {instance.pk: instance for instance in instances}
+    current = set(manager.values_list('pk', flat=True))
+    removed = current - set(wanted)
+    added = [instance for pk, instance in wanted.items() if pk not in current]
+    if removed:
+        manager.remove(*removed)
+    if added:
+        manager.add(*added)
+    return bool(removed or added)
+
+
 class PhotographerSerializer(WritableNestedModelSerializer):
     profile = ProfileSerializer(required=True, partial=True)
     photographer_photos = PhotoSerializer(many=True, required=False, allow_null=True)
@@ -143,82 +223,106 @@ class PhotographerSerializer(WritableNestedModelSerializer):
 
     class Meta:
         model = Photographer
-        fields = '__all__'
-
-    # Override default create method to auto create nested profile from photographer
+        # the packed availability and style columns are derived from the M2M fields
+        exclude = ('photographer_avail_bits', 'photographer_avail_prices', 'photographer_style_bits')
+
+    def validate_registration(self, data):
+        # Check the whole payload before anything is written and report every problem at once
+        errors = {}
+        profile_data = data.get('profile') or {}
+        username = (profile_data.get('user') or {}).get('username')
+        if not username :
+            errors['profile'] = {'user': {'username': ['This field is required.']}}
+        elif CustomUser.objects.filter(username=username).exists():
+            errors['profile'] = {'user': {'username': ['A user with that username already exists.']}}
+
+        links = list(dict.fromkeys(dict(photo_data)['photo_link'] for photo_data in data.get('photographer_photos') or []))
+        taken = list(Photo.objects.filter(photo_link__in=links).values_list('photo_link', flat=True))
+        if taken :
+            errors['photographer_photos'] = ['Photo link already in use: %s' % link for link in taken]
+
+        names = [dict(equipment_data)['equipment_name'] for equipment_data in data.get('photographer_equipment') or []]
+
+        # styles come in as names (registration) or as Style instances (validated data)
+        style_names = [getattr(style, 'pk', style) for style in data.get('photographer_style') or []]
+        styles = Style.objects.in_bulk(style_names)
+        unknown = [name for name in style_names if name not in styles]
+        if unknown :
+            errors['photographer_style'] = ['Unknown style: %s' % name for name in unknown]
+
+        slots = []
+        slot_errors = []
+        for avail_time_data in data.get('photographer_avail_time') or []:
+            avail_time_data = dict(avail_time_data)
+            try :
+                slot = (avail_time_data['avail_date'], avail_time_data['avail_time'], float(avail_time_data['photographer_price']))
+            except (KeyError, TypeError, ValueError):
+                slot_errors.append('avail_date, avail_time and a numeric photographer_price are required.')
+                continue
+            if slot[0] not in DAY_INDEX or slot[1] not in TIME_INDEX :
+                slot_errors.append('Invalid day or time: %s %s' % slot[:2])
+            slots.append(slot)
+        if slot_errors :
+            errors['photographer_avail_time'] = slot_errors
+
+        last_online_time = data.get('photographer_last_online_time')
+        if isinstance(last_online_time, str):
+            try :
+                last_online_time = serializers.DateTimeField().to_internal_value(last_online_time)
+            except serializers.ValidationError as e:
+                errors['photographer_last_online_time'] = e.detail
+
+        if errors :
+            raise serializers.ValidationError(errors)
+        return {'profile': profile_data, 'links': links, 'equipment': names,
+                'styles': [styles[name] for name in dict.fromkeys(style_names)],
+                'slots': list(dict.fromkeys(slots)), 'last_online_time': last_online_time}
+
+    # Override default create method to auto create nested profile from photographer.
+    # Validates everything first, then writes in one transaction with a fixed number of bulk queries.
+    @transaction.atomic
     def create(self, validated_data):
-        profile_data = validated_data.pop('profile')
-        profile = ProfileSerializer.create(ProfileSerializer(), validated_data=profile_data)
+        registration = self.validate_registration(validated_data)
+        slots = registration['slots']
+        profile = ProfileSerializer.create(ProfileSerializer(), validated_data=registration['profile'])
+        avail_bits, avail_prices = pack_availability(slots)
         photographer = Photographer.objects.create(profile=profile,
-                                                   photographer_last_online_time=validated_data.pop('photographer_last_online_time'),
+                                                   photographer_last_online_time=registration['last_online_time'],
+                                                   photographer_avail_bits=avail_bits,
+                                                   photographer_avail_prices=avail_prices,
+                                                   photographer_style_bits=pack_styles(style.pk for style in registration['styles']),
                                                    )
 
-        # create photo instance then add to photographer_photos field
-        # (photo_links are always unique)
-        for photo_data in validated_data.pop('photographer_photos'):
-            photo_data = dict(photo_data)
-            photo_instance = Photo.objects.create(photo_link=photo_data['photo_link'])
-            photographer.photographer_photos.add(photo_instance)
-
-        # create equipment instance then add to photographer_equipments field
-        for equipment_data in validated_data.pop('photographer_equipment'):
-            equipment_data = dict(equipment_data)
-            try :
-                equipment_instance = Equipment.objects.get(equipment_name=equipment_data['equipment_name'])
-            except :
-                equipment_instance = Equipment.objects.create(equipment_name=equipment_data['equipment_name'])
-            photographer.photographer_equipment.add(equipment_instance)
-
-        # add selected style to photographer_style
-        for style_data in validated_data.pop('photographer_style'):
-            style_instance = Style.objects.get(style_name=style_data)
-            photographer.photographer_style.add(style_instance)
-
-        # add avail time
-        # avail_list = []
-        for avail_time_data in validated_data.pop('photographer_avail_time'):
-            avail_time_data = dict(avail_time_data)
-            try :
-                avail_time_instance = AvailTime.objects.get(avail_date=avail_time_data['avail_date'],
-                                                            avail_time=avail_time_data['avail_time'],
-                                                            photographer_price=avail_time_data['photographer_price'])
-            except :
-                avail_time_instance = AvailTime.objects.create(**avail_time_data)
-            photographer.photographer_avail_time.add(avail_time_instance)
-
-            # avail_date=avail_time_data['avail_date']
-            # photographer_price2=(avail_time_data['photographer_price'])/2
-            # photographer_price3=(avail_time_data['photographer_price'])/3
-            # if avail_time_data['avail_time'] == 'FULL_DAY':
-            #     avail_list.append({'avail_date': avail_date, 'avail_time': 'HALF_DAY_MORNING', \
-            #     'photographer_price': photographer_price2})
-            #     avail_list.append({'avail_date': avail_date, 'avail_time': 'HALF_DAY_NOON', \
-            #     'photographer_price': photographer_price2})
-            # elif avail_time_data['avail_time'] == 'FULL_DAY_NIGHT':
-            #     avail_list.append({'avail_date': avail_date, 'avail_time': 'HALF_DAY_MORNING', \
-            #     'photographer_price': photographer_price3})
-            #     avail_list.append({'avail_date': avail_date, 'avail_time': 'HALF_DAY_NOON', \
-            #     'photographer_price': photographer_price3})
-            #     avail_list.append({'avail_date': avail_date, 'avail_time': 'FULL_DAY', \
-            #     'photographer_price': 2*photographer_price3})
-            #     avail_list.append({'avail_date': avail_date, 'avail_time': 'NIGHT', \
-            #     'photographer_price': photographer_price3})
-
-        # # for full day:add 2halfs, full day night: add 3parts
-        # for avail_time_data in avail_list:
-        #     # avail_time_data = dict(avail_time_data)
-        #     try :
-        #         avail_time_instance = AvailTime.objects.get(avail_date=avail_time_data['avail_date'],
-        #                                                     avail_time=avail_time_data['avail_time'],
-        #                                                     photographer_price=avail_time_data['photographer_price'])
-        #     except :
-        #         avail_time_instance = AvailTime.objects.create(**avail_time_data)
-        #     photographer.photographer_avail_time.add(avail_time_instance)
-
-        profile.save()
-        photographer.save()
+        # create photo instances (photo_links are always unique), reuse or create equipment and avail times
+        photos = [Photo(photo_link=link) for link in registration['links']]
+        Photo.objects.bulk_create(photos)
+        equipment = get_or_create_by_pk(Equipment, registration['equipment'])
+        avail_times = get_or_create_avail_times(slots)
+
+        # link them to the photographer, one insert per relation
+        links = ((Photographer.photographer_photos.through, 'photo_id', photos),
+                 (Photographer.photographer_equipment.through, 'equipment_id', equipment.values()),
+                 (Photographer.photographer_style.through, 'style_id', registration['styles']),
+                 (Photographer.photographer_avail_time.through, 'availtime_id', [avail_times[slot] for slot in slots]))
+        for Through, field, instances in links:
+            Through.objects.bulk_create([Through(photographer_id=photographer.pk, **{field: instance.pk})
+                                         for instance in instances])
+
+        # derived search rows, written from the data in hand
+        PhotographerPriceStats.store({photographer.pk: slots}, replace=False)
+        PhotographerEquipmentIndex.store((photographer.pk, name) for name in equipment)
+
+        # bulk inserted through rows send no m2m_changed, so do what the api.signals receivers
+        # would once the photographer is visible to other requests
+        def relations_written():
+            searchcache.bump_generation()
+            vectorsearch.engine.mark_dirty([photographer.pk])
+        transaction.on_commit(relations_written)
+        calendars.invalidate([photographer.pk])
         return photographer
 
+    # One transaction for the whole nested update
+    @transaction.atomic
     def update (self, instance, validated_data):
         # update profile
         if 'profile' in validated_data:
@@ -227,42 +331,27 @@ class PhotographerSerializer(WritableNestedModelSerializer):
                 profile_data_dict = dict(profile_data['user'])
                 profile_instance = ProfileSerializer.update(ProfileSerializer(required=False), instance=instance.profile, validated_data=profile_data)
 
-        # update photographer_photos
+        # update photographer_photos (only the links that were added or removed)
         if 'photographer_photos' in validated_data:
-            instance.photographer_photos.clear()
-            for photo_data in validated_data.pop('photographer_photos'):
-                photo_data = dict(photo_data)
-                try:
-                    photo_instance = Photo.objects.get(photo_link=photo_data['photo_link'])
-                except:
-                    photo_instance = Photo.objects.create(photo_link=photo_data['photo_link'])
-                instance.photographer_photos.add(photo_instance)
+            links = [dict(photo_data)['photo_link'] for photo_data in validated_data.pop('photographer_photos')]
+            photos = get_or_create_by_pk(Photo, links)
+            sync_m2m(instance.photographer_photos, [photos[link] for link in links])
 
         # photographer_equipment
         if 'photographer_equipment' in validated_data:
-            instance.photographer_equipment.clear()
-            for equipment_data in validated_data.pop('photographer_equipment'):
-                equipment_data = dict(equipment_data)
-                try :
-                    equipment_instance = Equipment.objects.get(equipment_name=equipment_data['equipment_name'])
-                except :
-                    equipment_instance = Equipment.objects.create(equipment_name=equipment_data['equipment_name'])
-                instance.photographer_equipment.add(equipment_instance)
+            names = [dict(equipment_data)['equipment_name'] for equipment_data in validated_data.pop('photographer_equipment')]
+            equipment = get_or_create_by_pk(Equipment, names)
+            # photographers.signals rebuilds the equipment index of the changed relation
+            sync_m2m(instance.photographer_equipment, [equipment[name] for name in names])
 
         # # photographer_avail_time
         if 'photographer_avail_time' in validated_data:
-            instance.photographer_avail_time.clear()
-        #     avail_list = []
-            for avail_time_data in validated_data.pop('photographer_avail_time'):
-                avail_time_data = dict(avail_time_data)
-                try :
-                    avail_time_instance = AvailTime.objects.get(avail_date=avail_time_data['avail_date'],
-                                                                avail_time=avail_time_data['avail_time'],
-                                                                photographer_price=avail_time_data['photographer_price'])
-                except :
-                    avail_time_instance = AvailTime.objects.create(**avail_time_data)
-                instance.photographer_avail_time.add(avail_time_instance)            
-            
+            slots = [(avail_time_data['avail_date'], avail_time_data['avail_time'], avail_time_data['photographer_price'])
+                     for avail_time_data in validated_data.pop('photographer_avail_time')]
+            avail_times = get_or_create_avail_times(slots)
+            # photographers.signals repacks the availability and price stats of the changed relation
+            sync_m2m(instance.photographer_avail_time, [avail_times[slot] for slot in slots])
+
         #         # check if fullday/fulldaynight
         #         avail_date=avail_time_data['avail_date']
         #         photographer_price2=(avail_time_data['photographer_price'])/2
@@ -299,10 +388,8 @@ class PhotographerSerializer(WritableNestedModelSerializer):
 
         # photographer_style
         if 'photographer_style' in validated_data:
-            instance.photographer_style.clear()
-            for style_data in validated_data.pop('photographer_style'):
-                style_instance = Style.objects.get(style_name=style_data)
-                instance.photographer_style.add(style_instance)
+            # already Style instances, resolved by the field; photographers.signals repacks the styles
+            sync_m2m(instance.photographer_style, validated_data.pop('photographer_style'))
 
         instance.save()
         return instance
@@ -386,6 +473,10 @@ class JobSerializer(serializers.ModelSerializer):
 
 
     # Override default create method to auto create nested profile from photographer
+    # All reservations are validated together: one query for the photographer's matching slots,
+    # one for the slots already booked on the requested dates (see SlotOccupancy); the job,
+    # reservations and notification are written atomically
+    @transaction.atomic
     def create(self, validated_data):
         job_customer=validated_data.pop('job_customer')
         job_customer=Customer.objects.get(profile__user__username=job_customer['profile']['user']['username'])
@@ -394,77 +485,49 @@ class JobSerializer(serializers.ModelSerializer):
         job_photographer=Photographer.objects.get(profile__user__username=job_photographer_username)
 
         job_status = "PENDING"
-        
-        # total_price = 0
-        reservation_list = []
-        # create job reservation instances and store them in reservation_list        
+
+        week_days = ("MONDAY","TUESDAY","WEDNESDAY","THURSDAY","FRIDAY","SATURDAY","SUNDAY")
+        requested = []
         for reservation_data in validated_data.pop('job_reservation'):
-            reservation_data = dict(reservation_data)
-            job_avail_time_data = dict(reservation_data['job_avail_time'])
             photoshoot_date = reservation_data['photoshoot_date']
             photoshoot_time = reservation_data['photoshoot_time']
-
+            requested.append((photoshoot_date, photoshoot_time, week_days[photoshoot_date.weekday()]))
+
+        # the photographer's slots for every requested (weekday, time) in one query
+        slots = {}
+        if requested :
+            condition = Q()
+            for photoshoot_date, photoshoot_time, weekday in requested:
+                condition |= Q(avail_date=weekday, avail_time=photoshoot_time)
+            for avail_time_instance in job_photographer.photographer_avail_time.filter(condition).order_by('pk'):
+                slots.setdefault((avail_time_instance.avail_date, avail_time_instance.avail_time), []).append(avail_time_instance)
+
+        # parts of the requested dates the photographer is already booked for, in one indexed lookup.
+        # Read without locking: this only refuses requests that already clash, a new job is PENDING and
+        # holds nothing. The slots are claimed with the ledger rows locked when the job is MATCHED.
+        occupied = SlotOccupancy.occupied(job_photographer.pk, {photoshoot_date for photoshoot_date, photoshoot_time, weekday in requested})
+
+        wanted = []
+        for photoshoot_date, photoshoot_time, weekday in requested:
             # Check if start date is valid
             if photoshoot_date < datetime.date.today():
                 raise serializers.ValidationError('The selected date should not be before today.')
             # Check valid start&end date
             if validated_data["job_expected_complete_date"] < photoshoot_date:
                 raise serializers.ValidationError('End date should not be before start date.')
-
-            # check if reservation date and time is valid
-            is_vaild = False
-            week_days = ("MONDAY","TUESDAY","WEDNESDAY","THURSDAY","FRIDAY","SATURDAY","SUNDAY")
-            for avail_time_instance in job_photographer.photographer_avail_time.all():
-                if avail_time_instance.avail_date == week_days[photoshoot_date.weekday()] and avail_time_instance.avail_time == photoshoot_time:
-                    # prevent creating job when photographer already has a job in the selected time
-                    if JobInfo.objects.filter(Q(job_photographer__profile__user__username=job_photographer_username) &
-                                              Q(job_reservation__photoshoot_date=photoshoot_date) & #old: no photoshoot_time
-                                              Q(job_reservation__photoshoot_time=photoshoot_time) &
-                                              Q(job_status='MATCHED')).exists(): #reconsider for more job_status
-                        raise serializers.ValidationError('''The photographer is not available on your selected date and time''')                   
-                    # if photoshoot_time == 'FULL_DAY' or photoshoot_time == 'FULL_DAY_NIGHT':
-                    #     if JobInfo.objects.filter(Q(job_photographer__profile__user__username=job_photographer_username) &
-                    #                           Q(job_reservation__photoshoot_date=photoshoot_date) &
-                    #                           (Q(job_reservation__photoshoot_time='HALF_DAY_MORNING') |
-                    #                           Q(job_reservation__photoshoot_time='HALF_DAY_NOON')) &
-                    #                           Q(job_status='MATCHED')).exists():
-                    #         raise serializers.ValidationError('''The photographer is not available on your selected date and time''')
-                    #     if photoshoot_time == 'FULL_DAY_NIGHT' :
-                    #         if JobInfo.objects.filter(Q(job_photographer__profile__user__username=job_photographer_username) &
-                    #                           Q(job_reservation__photoshoot_date=photoshoot_date) &
-                    #                           (Q(job_reservation__photoshoot_time='FULL_DAY') |
-                    #                           Q(job_reservation__photoshoot_time='NIGHT')) &
-                    #                           Q(job_status='MATCHED')).exists(): 
-                    #             raise serializers.ValidationError('''The photographer is not available on your selected date and time''')
-                    # elif photoshoot_time == 'NIGHT' :
-                    #     if JobInfo.objects.filter(Q(job_photographer__profile__user__username=job_photographer_username) &
-                    #                           Q(job_reservation__photoshoot_date=photoshoot_date) &
-                    #                           Q(job_reservation__photoshoot_time='FULL_DAY_NIGHT') &
-                    #                           Q(job_status='MATCHED')).exists():
-                    #         raise serializers.ValidationError('''The photographer is not available on your selected date and time''')
-                    # else:
-                    #     if JobInfo.objects.filter(Q(job_photographer__profile__user__username=job_photographer_username) &
-                    #                           Q(job_reservation__photoshoot_date=photoshoot_date) &
-                    #                           (Q(job_reservation__photoshoot_time='FULL_DAY') |
-                    #                           Q(job_reservation__photoshoot_time='FULL_DAY_NIGHT')) &
-                    #                           Q(job_status='MATCHED')).exists():
-                    #         raise serializers.ValidationError('''The photographer is not available on your selected date and time''')
-
-                    try :
-                        reservation_instance = JobReservation.objects.get(photoshoot_date=photoshoot_date,
-                                                                          photoshoot_time=photoshoot_time,
-                                                                          job_avail_time=avail_time_instance)
-                    except :
-                        reservation_instance = JobReservation.objects.create(photoshoot_date=photoshoot_date,
-                                                                             photoshoot_time=photoshoot_time,
-                                                                             job_avail_time=avail_time_instance)
-                ##########################################################################
-                    # total_price += avail_time_instance.photographer_price
-                    reservation_list.append(reservation_instance)
-                    
-                    is_vaild = True
-            if not is_vaild:
+            # check if reservation date and time is valid (one bit test on the packed weekly availability)
+            if not job_photographer.is_available(weekday, photoshoot_time) or (weekday, photoshoot_time) not in slots:
                 raise serializers.ValidationError('''Your selected date and time for reservation is invalid for the photographer, please checkout photographer's available time''')
+            # prevent creating job when photographer already has a job in the selected time
+            if occupied.get(photoshoot_date, 0) & SLOT_MASKS[photoshoot_time]:
+                raise serializers.ValidationError('''The photographer is not available on your selected date and time''')
+            for avail_time_instance in slots[(weekday, photoshoot_time)]:
+                wanted.append((photoshoot_date, photoshoot_time, avail_time_instance.pk))
+
+        reservation_list = list(get_or_create_reservations(wanted).values())
+        prices = {avail_time_instance.pk: avail_time_instance.photographer_price
+                  for instances in slots.values() for avail_time_instance in instances}
+        job_total_price = sum(prices[reservation.job_avail_time_id] for reservation in reservation_list) if reservation_list else None
         job_info = JobInfo.objects.create(job_title=validated_data.pop('job_title'), 
                                         job_description=validated_data.pop('job_description'), 
                                         job_customer=job_customer, 
@@ -473,9 +536,11 @@ class JobSerializer(serializers.ModelSerializer):
                                         job_style=validated_data.pop('job_style'),
                                         job_location=validated_data.pop('job_location'),
                                         job_expected_complete_date=validated_data.pop('job_expected_complete_date'),
-                                        job_special_requirement=validated_data.pop('job_special_requirement'))
-        job_info.job_reservation.add(*reservation_list)
-        job_info.save()
+                                        job_special_requirement=validated_data.pop('job_special_requirement'),
+                                        job_total_price=job_total_price)
+        # the total is already stored, write the through rows directly instead of refreshing it from the signal
+        JobInfo.job_reservation.through.objects.bulk_create([JobInfo.job_reservation.through(jobinfo_id=job_info.pk, jobreservation_id=reservation.pk)
+                                                             for reservation in reservation_list])
 
         # Create a notification
         NotificationSerializer.create(self,validated_data={'noti_job_id': job_info.job_id, 'noti_receiver':job_photographer.profile, \
@@ -483,43 +548,22 @@ class JobSerializer(serializers.ModelSerializer):
 
         return job_info
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # job_status
         if 'job_status' in validated_data:
             updated_status = validated_data.pop('job_status')
-            if instance.job_status == 'DECLINED' or instance.job_status == 'CANCELLED_BY_CUSTOMER' \
-                 or instance.job_status == 'CANCELLED_BY_PHOTOGRAPHER':
-                raise serializers.ValidationError('The job has already been cancelled or declined')
-            elif instance.job_status == 'REVIEWED':
-                raise serializers.ValidationError('This job is done')
-            elif instance.job_status == 'PENDING' and updated_status not in ['DECLINED', 'MATCHED', 'CANCELLED_BY_CUSTOMER'] :
-                raise serializers.ValidationError('The job cannot be updated to this status')
-            elif instance.job_status == 'MATCHED' and updated_status not in ['PAID', 'CANCELLED_BY_PHOTOGRAPHER', \
-                 'CANCELLED_BY_CUSTOMER'] :
-                raise serializers.ValidationError('The job cannot be updated to this status')
-            elif instance.job_status == 'PAID' and updated_status not in ['PROCESSING', 'CANCELLED_BY_PHOTOGRAPHER', \
-                 'CANCELLED_BY_CUSTOMER'] :
-                raise serializers.ValidationError('The job cannot be updated to this status')
-            elif instance.job_status == 'PROCESSING' and updated_status not in ['COMPLETED'] :
-                raise serializers.ValidationError('The job cannot be updated to this status')
-            elif instance.job_status == 'COMPLETED' and updated_status not in ['CLOSED'] :
-                raise serializers.ValidationError('The job cannot be updated to this status')
-            elif instance.job_status == 'CLOSED' and updated_status not in ['REVIEWED'] :
-                raise serializers.ValidationError('The job cannot be updated to this status')
-            else :
-            # instance.job_status = validated_data.pop('job_status')
-                instance.job_status = updated_status
-            # Create a notification
-                if instance.job_status == 'CANCELLED_BY_CUSTOMER' or instance.job_status == 'CANCELLED_BY_PHOTOGRAPHER' :
-                    noti_action = 'CANCEL'
-                else: noti_action = 'UPDATE'
-
-                if instance.job_status == 'CANCELLED_BY_CUSTOMER' or instance.job_status == 'PAID' or instance.job_status == 'CLOSED' or instance.job_status == 'REVIEWED' :
-                    NotificationSerializer.create(self,validated_data={'noti_job_id': instance.job_id, 'noti_receiver':instance.job_photographer.profile, \
-                    'noti_actor':instance.job_customer.profile, 'noti_action':noti_action, 'noti_status':instance.job_status, 'noti_read':'UNREAD'})
-                else:
-                    NotificationSerializer.create(self,validated_data={'noti_job_id': instance.job_id, 'noti_receiver':instance.job_customer.profile, \
-                    'noti_actor':instance.job_photographer.profile, 'noti_action': noti_action, 'noti_status':instance.job_status, 'noti_read':'UNREAD'})
+            error = transition_error(instance.job_status, updated_status)
+            if error is not None :
+                raise serializers.ValidationError(error)
+            # the one-job case of a bulk transition: status, booked slots and notification
+            job = {'pk': instance.pk, 'job_status': instance.job_status,
+                   'job_photographer_id': instance.job_photographer_id, 'job_customer_id': instance.job_customer_id}
+            try :
+                apply_transitions({instance.pk: job}, {instance.pk: updated_status})
+            except TransitionConflict as conflict :
+                raise serializers.ValidationError(conflict.message)
+            instance.job_status = updated_status
             #insert job url
             if 'job_url' in validated_data:
                 instance.job_url = validated_data.pop('job_url')
@@ -527,7 +571,12 @@ class JobSerializer(serializers.ModelSerializer):
             instance.save()
             return instance
 
-class GetJobsSerializer(serializers.ModelSerializer):
+class JobTransitionSerializer(serializers.Serializer):
+    job_id = serializers.IntegerField()
+    job_status = serializers.ChoiceField(choices=JOB_STATUS_CHOICES)
+
+class GetJobsSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    collapsed_fields = {'job_customer': 'profile.user.username', 'job_photographer': 'profile.user.username'}
     job_customer = CustomerSerializer(required=True, partial=True)
     job_photographer = PhotographerSerializer(required=True, partial=True)
     job_reservation = JobReservationSerializer(many=True, required=False, partial=True)
@@ -565,14 +614,27 @@ class PaymentSerializer(serializers.ModelSerializer):
         payments.save()
         return payments
     
+    # `instance` is the queryset of the paid job, moved through the job transition table like any other change
     def update(self, instance, validated_data) :
         if validated_data['payment_status'] == "DEPOSIT" :
-            instance.update(job_status="PAID")
+            updated_status = "PAID"
         elif validated_data['payment_status'] == "REMAINING" :
-            instance.update(job_status="CLOSED")
-
-
-class GetFavPhotographersSerializer(serializers.ModelSerializer):
+            updated_status = "CLOSED"
+        else :
+            return
+        jobs = load_jobs(instance.values_list('pk', flat=True))
+        targets = {job_id: updated_status for job_id in jobs}
+        errors = transition_errors(jobs, targets)
+        if errors :
+            raise serializers.ValidationError(sorted(set(errors.values())))
+        try :
+            apply_transitions(jobs, targets)
+        except TransitionConflict as conflict :
+            raise serializers.ValidationError(conflict.message)
+
+
+class GetFavPhotographersSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    collapsed_fields = {'fav_photographers': 'profile.user.username'}
     # profile = ProfileSerializer(required=True, partial=True)
     fav_photographers = PhotographerSerializer(required=True, partial=True,many = True)
 
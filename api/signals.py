@@ -0,0 +1,120 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from photographers.models import Photographer, AvailTime, Style
+from jobs.models import JobInfo
+from reviews.models import ReviewInfo, ReviewStats
+from users.models import CustomUser, CustomUserProfile
+from .searchcache import bump_generation
+from . import autocomplete, calendars, vectorsearch
+
+
+SEARCH_MODELS = (Photographer, AvailTime, Style, JobInfo, ReviewInfo, CustomUser, CustomUserProfile)
+SEARCH_M2M = (Photographer.photographer_avail_time.through, Photographer.photographer_style.through,
+              Photographer.photographer_equipment.through, Photographer.photographer_photos.through,
+              JobInfo.job_reservation.through)
+
+
+def invalidate_search(sender, **kwargs):
+    bump_generation()
+
+
+def invalidate_search_m2m(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_generation()
+
+
+for model in SEARCH_MODELS:
+    post_save.connect(invalidate_search, sender=model, dispatch_uid='search_cache_save_%s' % model.__name__)
+    post_delete.connect(invalidate_search, sender=model, dispatch_uid='search_cache_delete_%s' % model.__name__)
+for through in SEARCH_M2M:
+    m2m_changed.connect(invalidate_search_m2m, sender=through, dispatch_uid='search_cache_m2m_%s' % through.__name__)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_autocomplete(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.index.update(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def remove_autocomplete(sender, instance, **kwargs):
+    autocomplete.index.remove(instance.pk)
+
+
+# Rows of the vector search snapshot to reload before its next search
+
+@receiver(post_save, sender=Photographer)
+@receiver(post_delete, sender=Photographer)
+def mark_photographer_dirty(sender, instance, **kwargs):
+    vectorsearch.engine.mark_dirty([instance.pk])
+
+
+@receiver(post_save, sender=ReviewStats)
+def mark_review_stats_dirty(sender, instance, **kwargs):
+    vectorsearch.engine.mark_dirty([instance.photographer_id])
+
+
+@receiver(post_save, sender=AvailTime)
+def mark_avail_time_dirty(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        vectorsearch.engine.mark_dirty(instance.photographer_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Photographer.photographer_style.through)
+@receiver(m2m_changed, sender=Photographer.photographer_avail_time.through)
+def mark_m2m_dirty(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        vectorsearch.engine.mark_dirty([instance.pk])
+    elif pk_set is None:
+        # clear() from the Style/AvailTime side does not say which photographers lost it
+        vectorsearch.engine.expire()
+    else:
+        vectorsearch.engine.mark_dirty(pk_set)
+
+
+# Photographer calendars to recompute after the transaction commits
+
+@receiver(post_save, sender=JobInfo)
+@receiver(post_delete, sender=JobInfo)
+def invalidate_job_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        calendars.invalidate([instance.job_photographer_id])
+
+
+@receiver(m2m_changed, sender=JobInfo.job_reservation.through)
+def invalidate_reservation_calendar(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if not reverse:
+        calendars.invalidate([instance.job_photographer_id])
+    elif action == 'pre_clear':
+        calendars.invalidate(instance.jobinfo_set.values_list('job_photographer_id', flat=True))
+    else:
+        calendars.invalidate(JobInfo.objects.filter(pk__in=pk_set).values_list('job_photographer_id', flat=True))
+
+
+@receiver(post_save, sender=Photographer)
+def invalidate_photographer_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        calendars.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=AvailTime)
+def invalidate_avail_time_calendar(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        calendars.invalidate(instance.photographer_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Photographer.photographer_avail_time.through)
+def invalidate_avail_calendar(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if not reverse:
+        calendars.invalidate([instance.pk])
+    elif action == 'pre_clear':
+        calendars.invalidate(instance.photographer_set.values_list('pk', flat=True))
+    else:
+        calendars.invalidate(pk_set)
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from rest_framework import serializers
+
+from .search import parse_list
+
+
+class UsernameRelatedField(serializers.RelatedField):
+    # Read-only related object rendered as the username found at `related_source`
+    def __init__(self, related_source='profile.user.username', **kwargs):
+        kwargs['read_only'] = True
+        self.related_source = related_source
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        for attr in self.related_source.split('.'):
+            value = getattr(value, attr)
+        return value
+
+
+class SparseFieldsSerializerMixin:
+    """
+    ?fields=a,b keeps only the listed top-level fields, ?expand=a,b keeps the listed
+    nested objects in full. Once either parameter is given, every field in
+    `collapsed_fields` that is not expanded is rendered as its username(s) instead of
+    the nested serializer. Without both parameters the output is unchanged.
+    """
+    # nested field -> dotted path of the username it collapses to
+    collapsed_fields = {}
+
+    @property
+    def plan_key(self):
+        # the eager-loading plan depends on the requested shape
+        return self.context.get('sparse')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse = self.context.get('sparse')
+        if sparse is None :
+            return fields
+        only, expand = sparse
+        unknown = sorted(name for name in expand if name not in self.collapsed_fields)
+        if unknown :
+            raise serializers.ValidationError({'expand': 'Unknown field(s): %s.' % ', '.join(unknown)})
+        unknown = sorted(name for name in only or () if name not in fields)
+        if unknown :
+            raise serializers.ValidationError({'fields': 'Unknown field(s): %s.' % ', '.join(unknown)})
+
+        for name, username in self.collapsed_fields.items():
+            if name in expand or (only is not None and name not in only):
+                continue
+            if isinstance(fields[name], serializers.ListSerializer):
+                fields[name] = UsernameRelatedField(related_source=username, many=True)
+            else:
+                fields[name] = serializers.CharField(source=name + '.' + username, read_only=True)
+        if only is not None :
+            fields = OrderedDict((name, field) for name, field in fields.items() if name in only)
+        return fields
+
+
+class SparseFieldsMixin:
+    # Passes ?fields= and ?expand= to serializers using SparseFieldsSerializerMixin
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        params = self.request.query_params if self.request is not None else {}
+        if 'fields' in params or 'expand' in params :
+            context['sparse'] = (frozenset(parse_list(params, 'fields')) or None,
+                                 frozenset(parse_list(params, 'expand')))
+        return context
@@ -1,3 +1,299 @@
-from django.test import TestCase
+import datetime
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from customers.models import Customer
+from jobs.models import JobInfo, JobReservation, SlotOccupancy, SLOT_MASKS, JOB_STATUS_CHOICES, JOB_TRANSITIONS, \
+    JOB_FINAL_STATUS_ERRORS, JOB_STATUS_NOTIFICATIONS, transition_error
+from notification.models import Notification
+from photographers.models import Photographer, AvailTime
+from users.models import CustomUser, CustomUserProfile
+from . import calendars
+from .serializers import PaymentSerializer
+from .availability import availability_matrix
+from .search import filter_photographers
+from .transitions import TransitionConflict, apply_transitions, load_jobs
+
+
+def make_profile(username, user_type):
+    user = CustomUser.objects.create_user(username=username, password='pw12345!', user_type=user_type)
+    return CustomUserProfile.objects.create(user=user)
+
+
+class TransitionTableTests(SimpleTestCase):
+
+    def test_every_status_has_transitions(self):
+        self.assertEqual(set(JOB_TRANSITIONS), {key for key, _ in JOB_STATUS_CHOICES})
+
+    def test_final_statuses_cannot_move(self):
+        for status, targets in JOB_TRANSITIONS.items():
+            self.assertEqual(not targets, status in JOB_FINAL_STATUS_ERRORS, status)
+
+    def test_every_target_has_a_notification(self):
+        targets = {target for targets in JOB_TRANSITIONS.values() for target in targets}
+        self.assertLessEqual(targets, set(JOB_STATUS_NOTIFICATIONS))
+
+    def test_transition_error(self):
+        self.assertIsNone(transition_error('PENDING', 'MATCHED'))
+        self.assertIsNone(transition_error('MATCHED', 'CANCELLED_BY_CUSTOMER'))
+        self.assertEqual(transition_error('PENDING', 'PAID'), 'The job cannot be updated to this status')
+        self.assertEqual(transition_error('REVIEWED', 'CLOSED'), 'This job is done')
+        self.assertEqual(transition_error('DECLINED', 'MATCHED'), 'The job has already been cancelled or declined')
+        self.assertEqual(transition_error('EXPIRED', 'MATCHED'), 'The job has expired')
+
+
+class TransitionTestCase(TestCase):
+
+    def setUp(self):
+        self.photographer = Photographer.objects.create(profile=make_profile('bob', 1))
+        self.photographer.photographer_avail_time.add(*[
+            AvailTime.objects.create(avail_date='MONDAY', avail_time=slot, photographer_price=100)
+            for slot in ('HALF_DAY_MORNING', 'FULL_DAY', 'NIGHT')])
+        self.customer = Customer.objects.create(profile=make_profile('carol', 2))
+        self.date = datetime.date(2030, 1, 7)
+
+    def make_job(self, job_status='PENDING', slot='FULL_DAY', customer=None):
+        job = JobInfo.objects.create(job_title='Photoshoot', job_customer=customer or self.customer,
+                                     job_photographer=self.photographer, job_status=job_status, job_style='NONE',
+                                     job_location='Bangkok', job_expected_complete_date=self.date)
+        job.job_reservation.add(JobReservation.objects.create(
+            photoshoot_date=self.date, photoshoot_time=slot,
+            job_avail_time=self.photographer.photographer_avail_time.get(avail_time=slot)))
+        return job.pk
+
+    def statuses(self, job_ids):
+        return dict(JobInfo.objects.filter(pk__in=job_ids).values_list('pk', 'job_status'))
+
+
+class ApplyTransitionsTests(TransitionTestCase):
+
+    def test_one_update_per_status_pair(self):
+        pending = [self.make_job(slot=slot) for slot in ('HALF_DAY_MORNING', 'NIGHT')]
+        declined = self.make_job()
+        paid = self.make_job('PAID', slot='HALF_DAY_MORNING')
+        targets = {pending[0]: 'MATCHED', pending[1]: 'MATCHED', declined: 'DECLINED', paid: 'PROCESSING'}
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(apply_transitions(load_jobs(targets), targets), 4)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE') and 'jobs_jobinfo' in query['sql']]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.statuses(targets), targets)
+
+    def test_notifications_go_from_the_acting_party_to_the_other(self):
+        matched, cancelled = self.make_job(slot='NIGHT'), self.make_job()
+        targets = {matched: 'MATCHED', cancelled: 'CANCELLED_BY_CUSTOMER'}
+        apply_transitions(load_jobs(targets), targets)
+        notifications = Notification.objects.values_list('noti_job_id', 'noti_action', 'noti_status', 'noti_read',
+                                                          'noti_actor_id', 'noti_receiver_id')
+        self.assertEqual(sorted(notifications), sorted([
+            (matched, 'UPDATE', 'MATCHED', 'UNREAD', self.photographer.pk, self.customer.pk),
+            (cancelled, 'CANCEL', 'CANCELLED_BY_CUSTOMER', 'UNREAD', self.customer.pk, self.photographer.pk)]))
+
+    def test_matching_holds_and_cancelling_releases_slots(self):
+        job_id = self.make_job()
+        apply_transitions(load_jobs([job_id]), {job_id: 'MATCHED'})
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]), {self.date: SLOT_MASKS['FULL_DAY']})
+        apply_transitions(load_jobs([job_id]), {job_id: 'CANCELLED_BY_PHOTOGRAPHER'})
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]), {self.date: 0})
+
+    def test_search_cache_waits_for_the_commit(self):
+        job_id = self.make_job()
+        with mock.patch('api.searchcache.bump_generation') as bump_generation:
+            apply_transitions(load_jobs([job_id]), {job_id: 'MATCHED'})
+        # a TestCase never commits
+        bump_generation.assert_not_called()
+
+    def test_status_changed_since_it_was_read_is_a_conflict(self):
+        stale, fresh = self.make_job(slot='NIGHT'), self.make_job(slot='HALF_DAY_MORNING')
+        jobs = load_jobs([stale, fresh])
+        JobInfo.objects.filter(pk=stale).update(job_status='CANCELLED_BY_CUSTOMER')
+        with self.assertRaises(TransitionConflict) as raised:
+            apply_transitions(jobs, {stale: 'MATCHED', fresh: 'MATCHED'})
+        self.assertEqual(raised.exception.job_ids, [stale])
+        # all or nothing
+        self.assertEqual(self.statuses([stale, fresh]), {stale: 'CANCELLED_BY_CUSTOMER', fresh: 'PENDING'})
+        self.assertFalse(Notification.objects.exists())
+
+    def test_overlapping_jobs_in_one_batch_are_a_conflict(self):
+        full_day, morning = self.make_job(), self.make_job(slot='HALF_DAY_MORNING')
+        with self.assertRaises(TransitionConflict) as raised:
+            apply_transitions(load_jobs([full_day, morning]), {full_day: 'MATCHED', morning: 'MATCHED'})
+        self.assertEqual(raised.exception.job_ids, sorted([full_day, morning]))
+        self.assertEqual(self.statuses([full_day, morning]), {full_day: 'PENDING', morning: 'PENDING'})
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]).get(self.date, 0), 0)
+
+
+class PaymentTransitionTests(TransitionTestCase):
+    # PaymentViewSet.create moves the paid job with PaymentSerializer.update
+
+    def pay(self, job_id, payment_status):
+        PaymentSerializer().update(JobInfo.objects.filter(pk=job_id), {'payment_status': payment_status})
+
+    def test_deposit_moves_a_matched_job_to_paid(self):
+        job_id = self.make_job()
+        apply_transitions(load_jobs([job_id]), {job_id: 'MATCHED'})
+        self.pay(job_id, 'DEPOSIT')
+        self.assertEqual(self.statuses([job_id]), {job_id: 'PAID'})
+        self.assertTrue(Notification.objects.filter(noti_job_id=job_id, noti_status='PAID',
+                                                    noti_actor_id=self.customer.pk).exists())
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]), {self.date: SLOT_MASKS['FULL_DAY']})
+
+    def test_remaining_payment_closes_a_completed_job(self):
+        job_id = self.make_job('COMPLETED')
+        self.pay(job_id, 'REMAINING')
+        self.assertEqual(self.statuses([job_id]), {job_id: 'CLOSED'})
+
+    def test_payments_follow_the_transition_table(self):
+        job_id = self.make_job('CANCELLED_BY_CUSTOMER')
+        with self.assertRaises(ValidationError):
+            self.pay(job_id, 'DEPOSIT')
+        self.assertEqual(self.statuses([job_id]), {job_id: 'CANCELLED_BY_CUSTOMER'})
+
+
+class BulkTransitionTests(TransitionTestCase):
+    url = '/api/jobs/bulk-transition/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def post(self, user, targets):
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.url, [{'job_id': job_id, 'job_status': job_status}
+                                           for job_id, job_status in targets.items()], format='json')
+
+    def test_photographer_moves_own_jobs(self):
+        jobs = [self.make_job(slot=slot) for slot in ('HALF_DAY_MORNING', 'NIGHT')]
+        response = self.post(self.photographer.profile.user, {job_id: 'MATCHED' for job_id in jobs})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 2, 'jobs': [{'job_id': job_id, 'job_status': 'MATCHED'}
+                                                                for job_id in jobs]})
+        self.assertEqual(self.statuses(jobs), {job_id: 'MATCHED' for job_id in jobs})
+
+    def test_customer_cancels_own_job(self):
+        job_id = self.make_job()
+        response = self.post(self.customer.profile.user, {job_id: 'CANCELLED_BY_CUSTOMER'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses([job_id]), {job_id: 'CANCELLED_BY_CUSTOMER'})
+
+    def test_other_users_jobs_are_forbidden(self):
+        mine = self.make_job(slot='NIGHT', customer=Customer.objects.create(profile=make_profile('dave', 2)))
+        theirs = self.make_job()
+        response = self.post(CustomUser.objects.get(username='dave'),
+                             {mine: 'CANCELLED_BY_CUSTOMER', theirs: 'CANCELLED_BY_CUSTOMER'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, {str(theirs): ['You are not the customer or photographer of this job.']})
+        self.assertEqual(self.statuses([mine, theirs]), {mine: 'PENDING', theirs: 'PENDING'})
+
+    def test_a_party_cannot_make_the_other_partys_move(self):
+        job_id = self.make_job()
+        response = self.post(self.customer.profile.user, {job_id: 'MATCHED'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, {str(job_id): ['Only the photographer can move the job to this status.']})
+        response = self.post(self.photographer.profile.user, {job_id: 'CANCELLED_BY_CUSTOMER'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.statuses([job_id]), {job_id: 'PENDING'})
+
+    def test_superuser_moves_any_job(self):
+        job_id = self.make_job()
+        response = self.post(CustomUser.objects.create_superuser('admin', 'pw12345!'), {job_id: 'MATCHED'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_users_are_refused(self):
+        job_id = self.make_job()
+        response = self.client.post(self.url, [{'job_id': job_id, 'job_status': 'MATCHED'}], format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_transitions_outside_the_table_are_refused(self):
+        job_id, unknown = self.make_job(), 999999
+        response = self.post(self.photographer.profile.user, {job_id: 'COMPLETED', unknown: 'MATCHED'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {str(job_id): ['The job cannot be updated to this status'],
+                                         str(unknown): ['No job with this id.']})
+
+    def test_each_job_once_and_batch_size(self):
+        job_id = self.make_job()
+        self.client.force_authenticate(user=self.photographer.profile.user)
+        response = self.client.post(self.url, [{'job_id': job_id, 'job_status': 'MATCHED'},
+                                               {'job_id': job_id, 'job_status': 'DECLINED'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        with mock.patch('api.views.MAX_BULK_TRANSITIONS', 1):
+            response = self.post(self.photographer.profile.user, {job_id: 'MATCHED', self.make_job(slot='NIGHT'): 'MATCHED'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses([job_id]), {job_id: 'PENDING'})
+
+    def test_slot_conflict_is_409_and_writes_nothing(self):
+        full_day, morning = self.make_job(), self.make_job(slot='HALF_DAY_MORNING')
+        response = self.post(self.photographer.profile.user, {full_day: 'MATCHED', morning: 'MATCHED'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data, {'detail': 'The photographer is not available on your selected date and time',
+                                         'job_ids': sorted([full_day, morning])})
+        self.assertEqual(self.statuses([full_day, morning]), {full_day: 'PENDING', morning: 'PENDING'})
+        self.assertFalse(Notification.objects.exists())
+
+
+class ExpireJobsTests(TransitionTestCase):
+
+    def expire(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command('expire_jobs', date='2030-01-08', stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_only_jobs_changed_meanwhile_are_skipped(self):
+        changed, pending, matched = self.make_job(), self.make_job(slot='NIGHT'), self.make_job('MATCHED', 'HALF_DAY_MORNING')
+
+        def cancel_then_apply(jobs, targets):
+            JobInfo.objects.filter(pk=changed).update(job_status='CANCELLED_BY_CUSTOMER')
+            return apply_transitions(jobs, targets)
+        with mock.patch('api.management.commands.expire_jobs.apply_transitions', side_effect=cancel_then_apply):
+            out, err = self.expire()
+        self.assertEqual(self.statuses([changed, pending, matched]),
+                         {changed: 'CANCELLED_BY_CUSTOMER', pending: 'EXPIRED', matched: 'EXPIRED'})
+        self.assertIn('[%d]' % changed, err)
+        self.assertTrue(out.startswith('Expired 2 jobs (1 skipped)'))
+
+    def test_chunk_lines_need_verbosity_2(self):
+        self.make_job(), self.make_job(slot='NIGHT')
+        self.assertEqual(len(self.expire(chunk_size=1)[0].splitlines()), 1)
+        self.assertEqual(JobInfo.objects.filter(job_status='EXPIRED').count(), 2)
+        self.make_job(), self.make_job(slot='NIGHT')
+        self.assertEqual(len(self.expire(chunk_size=1, verbosity=2)[0].splitlines()), 3)
+
+
+class SlotOverlapTests(TransitionTestCase):
+    # The availability matrix, the calendar and the search date filters read the same occupancy ledger
+
+    def setUp(self):
+        super().setUp()
+        calendars.get_cache().clear()
+
+    def test_booked_full_day_blocks_the_half_days(self):
+        job_id = self.make_job()
+        apply_transitions(load_jobs([job_id]), {job_id: 'MATCHED'})
+        self.photographer.refresh_from_db()
+        expected = {'HALF_DAY_MORNING': 'BOOKED', 'FULL_DAY': 'BOOKED', 'NIGHT': 'FREE'}
+        self.assertEqual(availability_matrix(['bob'], self.date, self.date), {'bob': {self.date.isoformat(): expected}})
+        days = calendars.month_calendar(self.photographer, self.date.year, self.date.month)['days']
+        self.assertEqual(days[self.date.day - 1]['slots'], expected)
+
+    def test_search_hides_only_the_booked_slots(self):
+        full_day, night = self.make_job(), self.make_job(slot='NIGHT')
+        apply_transitions(load_jobs([full_day]), {full_day: 'MATCHED'})
+        date = self.date.strftime('%d_%m_%Y')
+
+        def found(**params):
+            return list(filter_photographers(params).values_list('pk', flat=True)) == [self.photographer.pk]
+        self.assertTrue(found(date=date))
+        self.assertTrue(found(date=date, time='NIGHT'))
+        self.assertFalse(found(date=date, time='HALF_DAY_MORNING'))
+        self.assertTrue(found(dates=date))
+        self.assertFalse(found(dates=date, time='FULL_DAY'))
+        apply_transitions(load_jobs([night]), {night: 'MATCHED'})
+        self.assertFalse(found(date=date))
+        self.assertFalse(found(date_from=date, date_to=date, date_match='any'))
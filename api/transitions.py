@@ -0,0 +1,148 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from jobs.models import JobInfo, SlotOccupancy, BOOKED_JOB_STATUSES, JOB_STATUS_NOTIFICATIONS, occupancy_masks, \
+    transition_error
+from notification.models import Notification
+from . import calendars, searchcache
+
+
+# jobs accepted by one bulk transition request
+MAX_BULK_TRANSITIONS = 500
+
+# what apply_transitions() needs to know about each job
+JOB_COLUMNS = ('pk', 'job_status', 'job_photographer_id', 'job_customer_id')
+
+
+class TransitionConflict(Exception):
+    # The database no longer allows some of the transitions; nothing was written
+    def __init__(self, job_ids, message):
+        super().__init__(message)
+        self.job_ids = sorted(job_ids)
+        self.message = message
+
+
+def load_jobs(job_ids):
+    # {job_id: {column: value}} for the JOB_COLUMNS of the given jobs, one query
+    return {row['pk']: row for row in JobInfo.objects.filter(pk__in=list(job_ids)).values(*JOB_COLUMNS)}
+
+
+def permission_errors(jobs, targets, user):
+    # {job_id: message} for jobs `user` is not the customer or photographer of, and for new statuses
+    # the other party sets (the acting side of JOB_STATUS_NOTIFICATIONS). Superusers may move any job.
+    # Users, profiles, customers and photographers share their primary key.
+    errors = {}
+    if user.is_superuser:
+        return errors
+    for job_id, new_status in targets.items():
+        if job_id not in jobs:
+            # reported by transition_errors()
+            continue
+        job = jobs[job_id]
+        if user.pk == job['job_photographer_id']:
+            party = 'photographer'
+        elif user.pk == job['job_customer_id']:
+            party = 'customer'
+        else:
+            errors[job_id] = 'You are not the customer or photographer of this job.'
+            continue
+        actor = JOB_STATUS_NOTIFICATIONS.get(new_status, (None, party))[1]
+        if actor != party:
+            errors[job_id] = 'Only the %s can move the job to this status.' % actor
+    return errors
+
+
+def transition_errors(jobs, targets):
+    # {job_id: message} for unknown jobs and moves JOB_TRANSITIONS does not allow, checked in memory
+    errors = {}
+    for job_id, new_status in targets.items():
+        if job_id not in jobs:
+            errors[job_id] = 'No job with this id.'
+            continue
+        error = transition_error(jobs[job_id]['job_status'], new_status)
+        if error is not None:
+            errors[job_id] = error
+    return errors
+
+
+def _reservations(job_ids):
+    reservations = defaultdict(list)
+    if job_ids:
+        for job_id, photoshoot_date, photoshoot_time in JobInfo.job_reservation.through.objects \
+                .filter(jobinfo_id__in=job_ids) \
+                .values_list('jobinfo_id', 'jobreservation__photoshoot_date', 'jobreservation__photoshoot_time'):
+            reservations[job_id].append((photoshoot_date, photoshoot_time))
+    return reservations
+
+
+def _update_occupancy(jobs, targets):
+    # Free the slots of booked jobs leaving the booked statuses, then hold those of newly MATCHED jobs
+    matched = [job_id for job_id, new_status in targets.items() if new_status == 'MATCHED']
+    released = [job_id for job_id, new_status in targets.items()
+                if jobs[job_id]['job_status'] in BOOKED_JOB_STATUSES and new_status not in BOOKED_JOB_STATUSES]
+    reservations = _reservations(matched + released)
+
+    freed = defaultdict(dict)
+    for job_id in released:
+        masks = freed[jobs[job_id]['job_photographer_id']]
+        for occupancy_date, mask in occupancy_masks(reservations[job_id]).items():
+            masks[occupancy_date] = masks.get(occupancy_date, 0) | mask
+    for photographer_id, masks in freed.items():
+        SlotOccupancy.release(photographer_id, masks)
+
+    held = defaultdict(dict)
+    held_by = defaultdict(list)
+    for job_id in matched:
+        photographer_id = jobs[job_id]['job_photographer_id']
+        masks = held[photographer_id]
+        for occupancy_date, mask in occupancy_masks(reservations[job_id]).items():
+            if masks.get(occupancy_date, 0) & mask:
+                # two jobs of the batch overlap each other
+                raise TransitionConflict(held_by[photographer_id] + [job_id],
+                                         'The photographer is not available on your selected date and time')
+            masks[occupancy_date] = masks.get(occupancy_date, 0) | mask
+        held_by[photographer_id].append(job_id)
+    for photographer_id, masks in held.items():
+        if SlotOccupancy.occupy(photographer_id, masks):
+            raise TransitionConflict(held_by[photographer_id],
+                                     'The photographer is not available on your selected date and time')
+
+
+def _notification(job, new_status):
+    action, actor = JOB_STATUS_NOTIFICATIONS[new_status]
+    photographer, customer = job['job_photographer_id'], job['job_customer_id']
+    return Notification(noti_job_id=job['pk'], noti_action=action, noti_status=new_status, noti_read='UNREAD',
+                        noti_actor_id=customer if actor == 'customer' else photographer,
+                        noti_receiver_id=photographer if actor == 'customer' else customer)
+
+
+def apply_transitions(jobs, targets):
+    """
+    Move every job of `targets` ({job_id: new status}) to its new status, all or nothing.
+
+    `jobs` comes from load_jobs() and must already pass transition_errors(). Jobs are updated
+    with one `UPDATE ... WHERE job_status=<status read>` per (old, new) status pair, so a job
+    changed by someone else in the meantime raises TransitionConflict instead of being
+    overwritten. The same happens when the slots of a newly MATCHED job are already booked.
+    Notifications are written with one bulk insert.
+    """
+    groups = defaultdict(list)
+    for job_id, new_status in targets.items():
+        groups[(jobs[job_id]['job_status'], new_status)].append(job_id)
+    with transaction.atomic():
+        for (old_status, new_status), job_ids in groups.items():
+            updated = JobInfo.objects.filter(pk__in=job_ids, job_status=old_status).update(job_status=new_status)
+            if updated != len(job_ids):
+                # jobs another request already moved to the same status look updated, report the group then
+                changed = set(job_ids) - set(JobInfo.objects.filter(pk__in=job_ids, job_status=new_status)
+                                             .values_list('pk', flat=True))
+                raise TransitionConflict(changed or job_ids, 'The job status was changed by another request')
+        _update_occupancy(jobs, targets)
+        Notification.objects.bulk_create([_notification(jobs[job_id], new_status)
+                                          for job_id, new_status in targets.items()])
+    # queryset updates send no post_save, the booked statuses feed the search availability and calendars.
+    # After commit: callers such as JobSerializer.update run inside a larger transaction.
+    transaction.on_commit(searchcache.bump_generation)
+    calendars.invalidate([jobs[job_id]['job_photographer_id'] for job_id in targets])
+    return len(targets)
@@ -3,12 +3,15 @@ from rest_framework.routers import DefaultRouter
 from .views import PhotographerViewSet, PhotoViewSet, EquipmentViewSet, PhotoViewSet, AvailTimeViewSet, \
     StyleViewSet, CustomerViewSet, JobsViewSet, JobReservationViewSet, UserViewSet, ProfileViewSet, \
     NotificationViewSet, PhotographerSearchViewSet, ChangePasswordViewSet, ReviewViewSet, PaymentViewSet,\
-    RegisterViewSet, GetjobsViewSet, GetPaymentToCustomerViewSet, GetPaymentToPhotographerViewSet, GetFavPhotographersViewSet
+    RegisterViewSet, GetjobsViewSet, GetPaymentToCustomerViewSet, GetPaymentToPhotographerViewSet, GetFavPhotographersViewSet, \
+    AvailabilityViewSet, CalendarViewSet
 
 
 router = DefaultRouter()
 router.register(r'photographers', PhotographerViewSet, basename='photographers')
 router.register(r'photographersearch', PhotographerSearchViewSet, basename='photographersearch')
+router.register(r'availability', AvailabilityViewSet, basename='availability')
+router.register(r'calendar', CalendarViewSet, basename='calendar')
 router.register(r'payment', PaymentViewSet, basename='payment')
 router.register(r'getpayment-photographer', GetPaymentToPhotographerViewSet, basename='getphotographerpayment')
 router.register(r'getpayment-customer', GetPaymentToCustomerViewSet, basename='getpayment-customer')
@@ -0,0 +1,328 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from photographers.models import Photographer, DAY_CHOICES, TIME_CHOICES, day_bits, time_bits, style_bit
+from users.search import search_users
+from .availability import blocked_occupancy, parse_search_date, parse_search_dates, weekday_name
+from .search import parse_price, parse_match, parse_list, equipment_photographers, relevance_weights, SEARCH_SORTS, \
+    RELEVANCE_REVIEW_HALF, RELEVANCE_RECENCY
+
+logger = logging.getLogger(__name__)
+
+# Query parameters the vectorized path understands; anything else falls back to SQL
+SUPPORTED_PARAMS = {'user', 'style', 'styles', 'styles_match', 'equipment', 'equipment_match', 'time',
+                    'date', 'dates', 'date_from', 'date_to', 'date_match', 'min_price', 'max_price',
+                    'sort', 'page', 'page_size', 'format'}
+
+# sort parameter -> snapshot column (the same keys as search.SEARCH_SORTS)
+SORT_COLUMNS = {
+    'time_des': 'last_online', 'time_asc': 'last_online',
+    'price_des': 'price_avg', 'price_asc': 'price_avg',
+    'review_des': 'review_count', 'review_asc': 'review_count',
+}
+
+SLOT_COUNT = len(DAY_CHOICES) * len(TIME_CHOICES)
+FLOAT_COLUMNS = ('last_online', 'price_min', 'price_avg', 'price_max', 'review_count', 'review_avg')
+
+
+def enabled():
+    if getattr(settings, 'PHOTOGRAPHER_SEARCH_ENGINE', 'sql') != 'vector':
+        return False
+    if np is None:
+        raise ImproperlyConfigured('PHOTOGRAPHER_SEARCH_ENGINE = "vector" needs numpy installed')
+    return True
+
+
+def _bit_columns(mask):
+    return [i for i in range(SLOT_COUNT) if mask >> i & 1]
+
+
+class VectorSearchEngine:
+    """
+    Columnar snapshot of the photographer catalogue for /api/photographersearch.
+
+    One row per photographer: style and weekly-slot bitsets, per-slot prices, price and review
+    stats and last online time. Filters become boolean masks and sorts become lexsorts over
+    these arrays; only bookings (which change constantly) and name matches are asked from the
+    database per search. Rows named by change signals are reloaded before the next search,
+    and the whole snapshot is rebuilt every PHOTOGRAPHER_SEARCH_REFRESH_SECONDS so each worker
+    also sees changes made in other processes. Sorting follows the SQL path: NULLs sort lowest
+    and pk breaks ties.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.dirty = set()
+        self.built_at = None
+
+    # Loading
+
+    def _load_rows(self, pks=None):
+        photographers = Photographer.objects.all()
+        if pks is not None:
+            photographers = photographers.filter(pk__in=pks)
+
+        rows = list(photographers.values_list(
+            'pk', 'photographer_last_online_time', 'price_stats__price_min', 'price_stats__price_avg',
+            'price_stats__price_max', 'review_stats__review_count', 'review_stats__review_avg',
+            'photographer_style_bits', 'photographer_avail_bits', 'photographer_avail_prices').order_by('pk'))
+        n = len(rows)
+        data = {
+            'pk': np.array([row[0] for row in rows], dtype=np.int64),
+            'style_bits': np.array([row[-3] for row in rows], dtype=np.int64),
+            'avail_bits': np.array([row[-2] for row in rows], dtype=np.int64),
+            'slot_prices': np.full((n, SLOT_COUNT), np.nan, dtype=np.float32),
+        }
+        for i, name in enumerate(FLOAT_COLUMNS):
+            values = [row[i + 1] for row in rows]
+            if name == 'last_online':
+                values = [value.timestamp() if value is not None else None for value in values]
+            data[name] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        # Unpack the compact price arrays into one column per weekly slot
+        for i, row in enumerate(rows):
+            if row[-2]:
+                data['slot_prices'][i, _bit_columns(row[-2])] = [float(price) for price in row[-1].split(',')]
+        return data
+
+    def build(self):
+        data = self._load_rows()
+        with self.lock:
+            self.data = data
+            self.data['alive'] = np.ones(len(data['pk']), dtype=bool)
+            self.row_of = {pk: i for i, pk in enumerate(data['pk'].tolist())}
+            self.dirty = set()
+            self.built_at = time.monotonic()
+
+    def mark_dirty(self, pks):
+        with self.lock:
+            if self.built_at is not None:
+                self.dirty.update(pks)
+
+    def expire(self):
+        # Rebuild the whole snapshot before the next search
+        with self.lock:
+            self.built_at = None
+
+    def refresh(self):
+        # Reload dirty rows in place; new photographers are appended, deleted ones masked out.
+        # The rows are read from the database outside the lock so searches are not held up.
+        with self.lock:
+            stale = self.built_at is None or time.monotonic() - self.built_at > \
+                getattr(settings, 'PHOTOGRAPHER_SEARCH_REFRESH_SECONDS', 600)
+            if not stale:
+                if not self.dirty:
+                    return
+                pks, self.dirty = list(self.dirty), set()
+        if stale:
+            self.build()
+            return
+        fresh = self._load_rows(pks)
+        found = set(fresh['pk'].tolist())
+        with self.lock:
+            for pk in pks:
+                if pk not in found and pk in self.row_of:
+                    self.data['alive'][self.row_of[pk]] = False
+
+            new_rows = []
+            for i, pk in enumerate(fresh['pk'].tolist()):
+                row = self.row_of.get(pk)
+                if row is None:
+                    new_rows.append(i)
+                    continue
+                for name, column in fresh.items():
+                    self.data[name][row] = column[i]
+                self.data['alive'][row] = True
+            if new_rows:
+                start = len(self.data['pk'])
+                for name, column in fresh.items():
+                    self.data[name] = np.concatenate([self.data[name], column[new_rows]])
+                self.data['alive'] = np.concatenate([self.data['alive'], np.ones(len(new_rows), dtype=bool)])
+                for offset, i in enumerate(new_rows):
+                    self.row_of[int(fresh['pk'][i])] = start + offset
+
+    # Searching
+
+    def supports(self, params):
+        return set(params) <= SUPPORTED_PARAMS
+
+    def search(self, params):
+        # pks of the matching photographers in result order
+        self.refresh()
+
+        # Everything asked from the database is fetched before the snapshot is locked
+        matches = None
+        user = params.get('user')
+        if user is not None and user.strip():
+            matches = dict(search_users(Photographer.objects.all(), user, 'profile__user__')
+                           .values_list('pk', 'name_rank'))
+        equipment_ids = None
+        equipment = parse_list(params, 'equipment')
+        if equipment:
+            equipment_ids = np.array(list(equipment_photographers(equipment, parse_match(params, 'equipment_match'))
+                                          .values_list('photographer', flat=True)), dtype=np.int64)
+        date = params.get('date')
+        date = parse_search_date(date) if date is not None else None
+        time_slot = params.get('time')
+        date_booked = self._booked([date], time_slot)[0] if date is not None else None
+        dates = parse_search_dates(params)
+        dates_booked = self._booked(dates, time_slot) if dates else None
+
+        with self.lock:
+            data = self.data
+            mask = data['alive'].copy()
+            pk = data['pk']
+
+            name_rank = None
+            if matches is not None:
+                mask &= np.isin(pk, np.fromiter(matches, dtype=np.int64, count=len(matches)))
+                name_rank = np.array([matches.get(value, 0) for value in pk.tolist()], dtype=np.int64) \
+                    if params.get('sort') not in SEARCH_SORTS else None
+
+            style = params.get('style')
+            if style is not None:
+                mask &= self._styles_mask(data, [style], 'all')
+            styles = parse_list(params, 'styles')
+            if styles:
+                mask &= self._styles_mask(data, styles, parse_match(params, 'styles_match'))
+            if equipment_ids is not None:
+                mask &= np.isin(pk, equipment_ids)
+            if time_slot is not None:
+                mask &= (data['avail_bits'] & self._bits(time_bits, time_slot)) != 0
+
+            min_price = parse_price(params, 'min_price')
+            max_price = parse_price(params, 'max_price')
+            if min_price is not None or max_price is not None:
+                columns = (1 << SLOT_COUNT) - 1
+                if time_slot is not None:
+                    columns &= self._bits(time_bits, time_slot)
+                if date is not None:
+                    columns &= day_bits(weekday_name(date))
+                prices = data['slot_prices'][:, _bit_columns(columns)]
+                within = ~np.isnan(prices)
+                if min_price is not None:
+                    within &= prices >= min_price
+                if max_price is not None:
+                    within &= prices <= max_price
+                mask &= within.any(axis=1)
+
+            if date is not None:
+                mask &= (data['avail_bits'] & day_bits(weekday_name(date))) != 0
+                mask &= ~np.isin(pk, date_booked)
+
+            if dates:
+                mask &= self._dates_mask(data, dates, parse_match(params, 'date_match'), dates_booked)
+
+            rows = np.nonzero(mask)[0]
+            return pk[rows[self._order(data, rows, params, name_rank)]]
+
+    @staticmethod
+    def _bits(function, key):
+        # Unknown choices match nothing, like the SQL filters
+        try:
+            return function(key)
+        except KeyError:
+            return 0
+
+    def _styles_mask(self, data, styles, match):
+        # Same rules as search.with_styles
+        bits = [self._bits(style_bit, style) for style in set(styles)]
+        if not any(bits) or (match == 'all' and not all(bits)):
+            return np.zeros(len(data['pk']), dtype=bool)
+        wanted = sum(bits)
+        if match == 'all':
+            return (data['style_bits'] & wanted) == wanted
+        return (data['style_bits'] & wanted) != 0
+
+    def _booked(self, dates, slot):
+        # Photographer pks blocked on any of `dates` (see availability.blocked_occupancy), and the (pk, date) pairs
+        pairs = list(blocked_occupancy(dates, slot).values_list('photographer_id', 'occupancy_date'))
+        return np.array([pk for pk, _ in pairs], dtype=np.int64), pairs
+
+    def _dates_mask(self, data, dates, match, booked):
+        pk = data['pk']
+        booked_pks, pairs = booked
+        if match == 'all':
+            works = np.ones(len(pk), dtype=bool)
+            for date in {weekday_name(date) for date in dates}:
+                works &= (data['avail_bits'] & day_bits(date)) != 0
+            return works & ~np.isin(pk, booked_pks)
+        free = np.zeros(len(pk), dtype=bool)
+        booked_on = {}
+        for photographer_id, date in pairs:
+            booked_on.setdefault(date, []).append(photographer_id)
+        for date in dates:
+            works = (data['avail_bits'] & day_bits(weekday_name(date))) != 0
+            free |= works & ~np.isin(pk, np.array(booked_on.get(date, []), dtype=np.int64))
+        return free
+
+    def _relevance(self, data, rows, params, name_rank):
+        # Same features and weights as search.relevance_score, over whole columns at once
+        review_count = np.nan_to_num(data['review_count'][rows])
+        last_online = data['last_online'][rows]
+        now = timezone.now().timestamp()
+        features = {
+            'rating': np.nan_to_num(data['review_avg'][rows]) / 10.0,
+            'reviews': review_count * 1.0 / (review_count + RELEVANCE_REVIEW_HALF),
+            'recency': np.select([last_online >= now - days * 86400 for days, _ in RELEVANCE_RECENCY],
+                                 [score for _, score in RELEVANCE_RECENCY], 0.0),
+        }
+        if name_rank is not None:
+            features['name'] = name_rank[rows] / 2.0
+        min_price = parse_price(params, 'min_price')
+        max_price = parse_price(params, 'max_price')
+        if min_price is not None or max_price is not None:
+            price = data['price_avg'][rows]
+            budget = ~np.isnan(price)
+            if min_price is not None:
+                budget &= price >= min_price
+            if max_price is not None:
+                budget &= price <= max_price
+            features['price'] = budget.astype(np.float64)
+
+        score = np.zeros(len(rows))
+        for name, weight in sorted(relevance_weights().items()):
+            if weight and name in features:
+                score = score + float(weight) * features[name]
+        return score
+
+    def _order(self, data, rows, params, name_rank):
+        pk = data['pk'][rows]
+        sort = params.get('sort')
+        if sort == 'relevance':
+            return np.lexsort((pk, -self._relevance(data, rows, params, name_rank)))
+        if sort in SORT_COLUMNS:
+            values = data[SORT_COLUMNS[sort]][rows]
+            null = np.isnan(values)
+            values = np.where(null, 0, values)
+            if SEARCH_SORTS[sort][0].startswith('-'):
+                # descending, NULLs last
+                return np.lexsort((pk, -values, null))
+            # ascending, NULLs first
+            return np.lexsort((pk, values, ~null))
+        if name_rank is not None:
+            return np.lexsort((pk, -name_rank[rows]))
+        return np.argsort(pk, kind='stable')
+
+
+engine = VectorSearchEngine()
+
+
+def warm_up():
+    # Called once per worker at startup when the vector engine is on
+    if not enabled():
+        return
+    try:
+        engine.refresh()
+    except DatabaseError:
+        logger.warning('Search snapshot not built at startup, it will be built on first use')
@@ -1,10 +1,11 @@
 from rest_framework.decorators import action
 from rest_framework import status, viewsets, filters, mixins, pagination
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from .permissions import IsUser
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Avg, Case, IntegerField, Value, When, Sum
+from django.db.models import Q
 from django.http import HttpResponseBadRequest
 import datetime
 import os
@@ -13,7 +14,7 @@ import omise
 # Import Serializers of apps
 from .serializers import PhotographerSerializer, CustomerSerializer, JobSerializer, JobReservationSerializer, UserSerializer, \
     PhotoSerializer, AvailTimeSerializer, EquipmentSerializer, ProfileSerializer, StyleSerializer, NotificationSerializer, ChangePasswordSerializer, \
-    ReviewSerializer, PaymentSerializer, GetJobsSerializer, GetPaymentToPhotographerSerializer, GetPaymentToCustomerSerializer, GetFavPhotographersSerializer,\
+    ReviewSerializer, PaymentSerializer, GetJobsSerializer, JobTransitionSerializer, GetPaymentToPhotographerSerializer, GetPaymentToCustomerSerializer, GetFavPhotographersSerializer,\
     UserSerializer
 # Import models of apps for queryset
 from photographers.models import Photographer, Photo, AvailTime, Equipment, Style
@@ -23,28 +24,39 @@ from users.models import CustomUser, CustomUserProfile
 from notification.models import Notification
 from reviews.models import ReviewInfo
 from payments.models import Payment
-
-
-class PhotographerViewSet(viewsets.ModelViewSet):
+# Import search helpers
+from .search import filter_photographers, sort_photographers, facet_counts
+from .availability import availability_matrix, parse_date_range, MAX_MATRIX_PHOTOGRAPHERS
+from .filters import NameSearchFilter
+from .eager import EagerLoadingMixin, eager_load
+from .sparse import SparseFieldsMixin
+from .fastread import FastReadMixin
+from .transitions import MAX_BULK_TRANSITIONS, TransitionConflict, apply_transitions, load_jobs, permission_errors, \
+    transition_errors
+from .pagination import PhotographerSearchCursorPagination
+from . import searchcache, autocomplete, vectorsearch, calendars
+
+
+class PhotographerViewSet(FastReadMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = PhotographerSerializer
     queryset = Photographer.objects.all()
     # permission_classes = [AllowAny]
     lookup_field = 'profile__user__username'
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['profile__user__username',"profile__user__first_name","profile__user__last_name"]
+    filter_backends = [NameSearchFilter]
+    name_search_user_path = 'profile__user__'
 
 
-class PhotoViewSet(viewsets.ModelViewSet):
+class PhotoViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = PhotoSerializer
     queryset = Photo.objects.all()
 
 
-class AvailTimeViewSet(viewsets.ModelViewSet):
+class AvailTimeViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = AvailTimeSerializer
     queryset = AvailTime.objects.all()
 
 
-class StyleViewSet(viewsets.ModelViewSet):
+class StyleViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = StyleSerializer
     queryset = Style.objects.all()
 
@@ -52,78 +64,121 @@ class PhotographerSearchPagination(pagination.PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
 
-class PhotographerSearchViewSet(viewsets.ModelViewSet) :
+class PhotographerSearchViewSet(FastReadMixin, EagerLoadingMixin, viewsets.ModelViewSet) :
     serializer_class = PhotographerSerializer
     pagination_class = PhotographerSearchPagination
     def get_queryset(self):
-        #Filter name
-        user = self.request.query_params.get('user')
-        if user is not None :
-            nameset = Photographer.objects.filter(Q(profile__user__username__icontains=user)|Q(profile__user__first_name__icontains=user)|Q(profile__user__last_name__icontains=user))
-        else : nameset = Photographer.objects.all()
-
-        #Filter other parameters
-        style = self.request.query_params.get('style')
-        time = self.request.query_params.get('time')
-        metafil = {'photographer_style__style_name': style, 'photographer_avail_time__avail_time': time}
-        filters = {k: v for k, v in metafil.items() if v is not None}
-        paraset = nameset.filter(**filters)
-
-        #Filter Date (allphotographer - photographerwithjobs)
-        date = self.request.query_params.get('date')
-        if date is not None :
-            #Filter Photographer by date
-            day, month, year = (int(x) for x in date.split('_')) 
-            sel_date = (datetime.date(year, month, day)).strftime('%A')
-            dateset = paraset.filter(photographer_avail_time__avail_date = sel_date)
-            #Filter out reserved photographer
-            compdate = "-".join(date.split("_")[::-1])
-            jobset = JobInfo.objects.filter(job_reservation__photoshoot_date = compdate).values_list('job_photographer_id', flat=True)
-            toremove = []
-            for cid in jobset :
-                if dateset.filter(profile__user__id=cid) is not None:
-                    toremove.append(cid)
-            queryset = dateset.filter(~Q(profile__user__id__in=toremove))
-        else : queryset = paraset
-        
-        #Sort
-        sort = self.request.query_params.get('sort')
-        if sort == "time_des" :
-            return queryset.order_by("-photographer_last_online_time")
-        elif sort == "time_asc" :
-            return queryset.order_by("photographer_last_online_time")
-        elif sort == "price_des" :
-            return queryset.annotate(price=Avg('photographer_avail_time__photographer_price')).order_by('-price')
-        elif sort == "price_asc" :
-            return queryset.annotate(price=Avg('photographer_avail_time__photographer_price')).order_by('price')
-        elif sort == "review_des":
-            counts = dict()
-            jobidlist = ReviewInfo.objects.values_list('reviewJob', flat=True)
-            for i in jobidlist :
-                pid = JobInfo.objects.filter(job_id=i).values_list('job_photographer_id', flat=True)
-                counts[pid[0]] = counts.get(pid[0], 0) + 1
-            return queryset.annotate(
-                            score=Case(
-                            *[When(profile__user__id=k, then=Value(v)) for k,v in counts.items()],
-                            default=None,
-                            output_field=IntegerField(null=True)
-                            )).order_by('-score')
-        elif sort == "review_asc" :
-            counts = dict()
-            jobidlist = ReviewInfo.objects.values_list('reviewJob', flat=True)
-            for i in jobidlist :
-                pid = JobInfo.objects.filter(job_id=i).values_list('job_photographer_id', flat=True)
-                counts[pid[0]] = counts.get(pid[0], 0) + 1
-            return queryset.annotate(
-                            score=Case(
-                            *[When(profile__user__id=k, then=Value(v)) for k,v in counts.items()],
-                            default=None,
-                            output_field=IntegerField(null=True)
-                            )).order_by('score')
-        return queryset
-
-
-class PaymentViewSet(viewsets.ModelViewSet):
+        params = self.request.query_params
+        return sort_photographers(filter_photographers(params), params)
+
+    def list(self, request, *args, **kwargs):
+        # Serve repeated searches from the result cache (see api.searchcache)
+        cache = searchcache.get_cache()
+        key = searchcache.cache_key(request)
+        data = cache.get(key)
+        if data is not None :
+            searchcache.record_hit()
+            return Response(data, headers={'X-Search-Cache': 'HIT'})
+        searchcache.record_miss()
+        if vectorsearch.enabled() and not isinstance(self.paginator, PhotographerSearchCursorPagination) \
+                and vectorsearch.engine.supports(request.query_params) :
+            response = self.vector_list(request)
+        else :
+            response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data)
+        response['X-Search-Cache'] = 'MISS'
+        return response
+
+    def vector_list(self, request):
+        # Filter and order in the NumPy snapshot, then load only the page's photographers
+        pks = [int(pk) for pk in self.paginate_queryset(vectorsearch.engine.search(request.query_params))]
+        reader = self.get_fast_reader()
+        if reader is not None :
+            rows = {row['pk']: row for row in reader.values(Photographer.objects.filter(pk__in=pks))}
+            return self.get_paginated_response(reader.render([rows[pk] for pk in pks if pk in rows]))
+        photographers = eager_load(Photographer.objects.all(), self.get_serializer_class()).in_bulk(pks)
+        page = [photographers[pk] for pk in pks if pk in photographers]
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_fast_reader(self):
+        # cursor pagination reads its position from model instances
+        if isinstance(self.paginator, PhotographerSearchCursorPagination) :
+            return None
+        return super().get_fast_reader()
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Counts per style/time/day/price bucket for the current filters, cached like the list
+        cache = searchcache.get_cache()
+        key = searchcache.cache_key(request)
+        data = cache.get(key)
+        if data is None :
+            data = facet_counts(filter_photographers(request.query_params))
+            cache.set(key, data)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # Name completions for the search box from the in-process prefix index
+        prefix = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        if not prefix :
+            return Response([])
+        autocomplete.index.ensure_built()
+        return Response(autocomplete.index.complete(prefix, limit))
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(searchcache.stats())
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or any ?cursor=) switches to keyset pagination
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params :
+                self._paginator = PhotographerSearchCursorPagination()
+            else :
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class AvailabilityViewSet(viewsets.ViewSet):
+    # Read-only photographer x date x slot availability:
+    # /api/availability/?photographers=alice,bob&date_from=01_05_2020&date_to=31_05_2020
+    def list(self, request):
+        usernames = [name for name in request.query_params.get('photographers', '').split(',') if name]
+        if not usernames :
+            raise ValidationError({'photographers': 'A comma separated list of usernames is required.'})
+        if len(usernames) > MAX_MATRIX_PHOTOGRAPHERS :
+            raise ValidationError({'photographers': 'At most %d photographers per request.' % MAX_MATRIX_PHOTOGRAPHERS})
+        date_from, date_to = parse_date_range(request.query_params)
+        return Response({'date_from': date_from, 'date_to': date_to,
+                         'photographers': availability_matrix(usernames, date_from, date_to)})
+
+
+class CalendarViewSet(viewsets.ViewSet):
+    # A photographer's month: /api/calendar/alice/?month=05_2020 (FREE/PENDING/BOOKED per offered slot),
+    # or the next bookable slots: /api/calendar/alice/?next_free=5
+    lookup_field = 'username'
+    lookup_value_regex = '[^/]+'
+
+    def retrieve(self, request, username=None):
+        photographer = get_object_or_404(Photographer.objects.only('pk', 'photographer_avail_bits', 'photographer_avail_prices'),
+                                         profile__user__username=username)
+        params = request.query_params
+        if 'next_free' in params :
+            return Response({'photographer': username,
+                             'next_free': calendars.next_free(photographer, calendars.parse_next_free(params))})
+        year, month = calendars.parse_month(params)
+        return Response(dict(calendars.month_calendar(photographer, year, month), photographer=username))
+
+
+class PaymentViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     queryset = Payment.objects.all()
     # permission_classes = [AllowAny]
@@ -139,7 +194,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         data['payment_customer'] = job.values_list('job_customer__profile__user__username', flat=True)[0]
         data['payment_photographer'] = job.values_list('job_photographer__profile__user__username', flat=True)[0]
         data['payment_job'] = jid
-        amount = job.annotate(job_total_price=Sum('job_reservation__job_avail_time__photographer_price')).values_list('job_total_price', flat=True)[0]
+        amount = job.values_list('job_total_price', flat=True)[0]
         job_status = job.values_list('job_status', flat=True)[0]
         if job_status == "MATCHED" :
             amount = amount * 0.3
@@ -175,64 +230,80 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
         return Response(data="Payment Successful.")
 
-class GetPaymentToPhotographerViewSet(viewsets.ReadOnlyModelViewSet):
+class GetPaymentToPhotographerViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = GetPaymentToPhotographerSerializer
 
     def get_queryset(self):
         return Payment.objects.exclude(payment_job__job_status="CANCELLED_BY_PHOTOGRAPHER")
 
-class GetPaymentToCustomerViewSet(viewsets.ReadOnlyModelViewSet):
+class GetPaymentToCustomerViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = GetPaymentToCustomerSerializer
 
     def get_queryset(self):
         return Payment.objects.filter(payment_job__job_status="CANCELLED_BY_PHOTOGRAPHER")
 
-class EquipmentViewSet(viewsets.ModelViewSet):
+class EquipmentViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = EquipmentSerializer
     queryset = Equipment.objects.all()
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     # permission_classes = [AllowAny]
     lookup_field = 'profile__user__username'
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['profile__user__username']
+    filter_backends = [NameSearchFilter]
+    name_search_user_path = 'profile__user__'
 
 
-class JobsViewSet(viewsets.ModelViewSet):
+class JobsViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = JobInfo.objects.all()
     serializer_class = JobSerializer
     # permission_classes = [AllowAny]
     filter_backends = [filters.SearchFilter]
     search_fields = ['job_photographer__profile__user__username','job_customer__profile__user__username']
 
-    def get_queryset(self):
-        return JobInfo.objects.annotate(
-            job_total_price=Sum('job_reservation__job_avail_time__photographer_price')
-        )
+    @action(detail=False, methods=['post'], url_path='bulk-transition')
+    def bulk_transition(self, request):
+        # [{"job_id": 1, "job_status": "MATCHED"}, ...] on the user's own jobs, checked against the transition
+        # table and applied all or nothing
+        serializer = JobTransitionSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if len(serializer.validated_data) > MAX_BULK_TRANSITIONS :
+            raise ValidationError({'transitions': 'At most %d jobs per request.' % MAX_BULK_TRANSITIONS})
+        targets = {item['job_id']: item['job_status'] for item in serializer.validated_data}
+        if len(targets) < len(serializer.validated_data) :
+            raise ValidationError({'transitions': 'Each job may appear only once.'})
+        jobs = load_jobs(targets)
+        errors = permission_errors(jobs, targets, request.user)
+        if errors :
+            return Response({str(job_id): [message] for job_id, message in sorted(errors.items())},
+                            status=status.HTTP_403_FORBIDDEN)
+        errors = transition_errors(jobs, targets)
+        if errors :
+            raise ValidationError({str(job_id): [message] for job_id, message in sorted(errors.items())})
+        try :
+            apply_transitions(jobs, targets)
+        except TransitionConflict as conflict :
+            return Response({'detail': conflict.message, 'job_ids': conflict.job_ids}, status=status.HTTP_409_CONFLICT)
+        return Response({'updated': len(targets),
+                         'jobs': [{'job_id': job_id, 'job_status': new_status} for job_id, new_status in targets.items()]})
 
-class GetjobsViewSet(viewsets.ReadOnlyModelViewSet):
+class GetjobsViewSet(SparseFieldsMixin, FastReadMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = JobInfo.objects.all()
     serializer_class = GetJobsSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['job_photographer__profile__user__username','job_customer__profile__user__username'] 
 
-    def get_queryset(self):
-        return JobInfo.objects.annotate(
-            job_total_price=Sum('job_reservation__job_avail_time__photographer_price')
-        )    
-
-class JobReservationViewSet(viewsets.ModelViewSet):
+class JobReservationViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = JobReservation.objects.all()
     serializer_class = JobReservationSerializer
     # permission_classes = [AllowAny]
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     # permission_classes = [AllowAny]
@@ -260,7 +331,7 @@ class RegisterViewSet(mixins.CreateModelMixin,viewsets.GenericViewSet):
             user = CustomerSerializer.create(CustomerSerializer(), validated_data=request.data)
         return Response(data={'message': message})
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = CustomUserProfile.objects.all()
     serializer_class = ProfileSerializer
     # permission_classes = [AllowAny]
@@ -268,7 +339,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['user__username']
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(FastReadMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     queryset = Notification.objects.all()
     # permission_classes = [AllowAny]
@@ -276,7 +347,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['noti_receiver__user__username']
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = ReviewInfo.objects.filter()
     serializer_class = ReviewSerializer
     permission_classes = [AllowAny]
@@ -284,7 +355,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['reviewJob__job_photographer__profile__user__username','reviewJob__job_customer__profile__user__username']
 
-class GetFavPhotographersViewSet(viewsets.ReadOnlyModelViewSet):
+class GetFavPhotographersViewSet(SparseFieldsMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = GetFavPhotographersSerializer
     lookup_field = 'profile__user__username'
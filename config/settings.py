@@ -119,6 +119,54 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# The search cache is invalidated through a generation counter stored in the cache itself,
+# so with several worker processes it has to be a shared backend (memcached/redis);
+# locmem only sees the invalidations of its own process and relies on TIMEOUT for the rest.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'photographersearch',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+    'calendar': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'photographercalendar',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+PHOTOGRAPHER_SEARCH_CACHE = 'search'
+PHOTOGRAPHER_CALENDAR_CACHE = 'calendar'
+
+# Each worker rebuilds its autocomplete index this often to see other workers' user changes
+AUTOCOMPLETE_REFRESH_SECONDS = 300
+
+# Photographer search engine: 'sql' (default) or 'vector', which filters and sorts an in-memory
+# NumPy snapshot of the catalogue and rebuilds it this often in each worker. numpy is optional,
+# install requirements-vector.txt instead of requirements.txt to use it
+PHOTOGRAPHER_SEARCH_ENGINE = 'sql'
+PHOTOGRAPHER_SEARCH_REFRESH_SECONDS = 600
+
+# Render the photographer, job, notification and search lists from values() rows instead of
+# model instances (see api.fastread); the output is the same
+FAST_READ_SERIALIZERS = False
+
+# Per-feature overrides of api.search.RELEVANCE_WEIGHTS for ?sort=relevance, e.g. {'price': 0}
+PHOTOGRAPHER_RELEVANCE_WEIGHTS = {}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
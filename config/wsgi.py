@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Build the in-process autocomplete index and search snapshot before the first request
+from api import autocomplete, vectorsearch
+autocomplete.warm_up()
+vectorsearch.warm_up()
@@ -1,8 +1,10 @@
 from django.contrib import admin
 from .models import JobInfo
 from .models import JobReservation
+from .models import SlotOccupancy
 
 admin.site.register(JobInfo)
 admin.site.register(JobReservation)
+admin.site.register(SlotOccupancy)
 # Register your models here.
 # TODO register to admin page
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobs.models import JobInfo
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored JobInfo.job_total_price of every job, one chunk of jobs at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_pk = None
+        total = 0
+        while True:
+            jobs = JobInfo.objects.order_by('pk')
+            if last_pk is not None:
+                jobs = jobs.filter(pk__gt=last_pk)
+            pks = list(jobs.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            with transaction.atomic():
+                JobInfo.refresh_total_price(pks)
+            total += len(pks)
+            self.stdout.write('Backfilled total price for %d jobs' % total)
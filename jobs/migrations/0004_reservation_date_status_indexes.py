@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0003_auto_20200319_1245'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jobreservation',
+            name='photoshoot_date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='jobinfo',
+            index=models.Index(fields=['job_photographer', 'job_status'], name='job_photographer_status_idx'),
+        ),
+    ]
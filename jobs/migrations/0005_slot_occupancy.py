@@ -0,0 +1,58 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copies of jobs.models.BOOKED_JOB_STATUSES, SLOT_MASKS and occupancy_masks as of this
+# migration, so later changes to the live definitions do not change what the migration does
+BOOKED_JOB_STATUSES = ['MATCHED', 'PAID', 'PROCESSING', 'COMPLETED', 'CLOSED', 'REVIEWED']
+SLOT_MASKS = {'HALF_DAY_MORNING': 1, 'HALF_DAY_NOON': 2, 'FULL_DAY': 3, 'NIGHT': 4, 'FULL_DAY_NIGHT': 7}
+
+
+def occupancy_masks(reservations):
+    masks = {}
+    for photoshoot_date, photoshoot_time in reservations:
+        masks[photoshoot_date] = masks.get(photoshoot_date, 0) | SLOT_MASKS[photoshoot_time]
+    return masks
+
+
+def build_slot_occupancy(apps, schema_editor):
+    JobInfo = apps.get_model('jobs', 'JobInfo')
+    SlotOccupancy = apps.get_model('jobs', 'SlotOccupancy')
+    reservations = {}
+    for photographer_id, photoshoot_date, photoshoot_time in JobInfo.objects.filter(job_status__in=BOOKED_JOB_STATUSES) \
+            .values_list('job_photographer_id', 'job_reservation__photoshoot_date', 'job_reservation__photoshoot_time') \
+            .iterator():
+        if photoshoot_date is not None:
+            reservations.setdefault(photographer_id, []).append((photoshoot_date, photoshoot_time))
+    SlotOccupancy.objects.bulk_create([SlotOccupancy(photographer_id=photographer_id, occupancy_date=occupancy_date,
+                                                     occupied_mask=mask)
+                                       for photographer_id, pairs in reservations.items()
+                                       for occupancy_date, mask in occupancy_masks(pairs).items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0005_style_bits_equipment_index'),
+        ('jobs', '0004_reservation_date_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occupancy_date', models.DateField()),
+                ('occupied_mask', models.PositiveSmallIntegerField(default=0)),
+                ('photographer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_occupancy', to='photographers.Photographer')),
+            ],
+            options={
+                'verbose_name_plural': 'Slot occupancy',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slotoccupancy',
+            constraint=models.UniqueConstraint(fields=('photographer', 'occupancy_date'), name='slot_occupancy_photographer_date_uniq'),
+        ),
+        migrations.RunPython(build_slot_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_total_price(apps, schema_editor):
+    JobInfo = apps.get_model('jobs', 'JobInfo')
+    totals = JobInfo.objects.annotate(total=Sum('job_reservation__job_avail_time__photographer_price')) \
+        .filter(total__isnull=False).values_list('pk', 'total')
+    JobInfo.objects.bulk_update([JobInfo(pk=pk, job_total_price=total) for pk, total in totals.iterator()],
+                                ['job_total_price'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0005_slot_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobinfo',
+            name='job_total_price',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_total_price, migrations.RunPython.noop),
+    ]
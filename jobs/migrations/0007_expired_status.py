@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0006_jobinfo_total_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jobinfo',
+            name='job_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('DECLINED', 'Declined'), ('MATCHED', 'Matched'), ('PAID', 'Paid'), ('CANCELLED_BY_PHOTOGRAPHER', 'Cancelled by photographer'), ('CANCELLED_BY_CUSTOMER', 'Cancelled by customer'), ('PROCESSING', 'Processing Photos'), ('COMPLETED', 'Completed'), ('CLOSED', 'Closed'), ('REVIEWED', 'Reviewed'), ('EXPIRED', 'Expired')], default='PENDING', max_length=25),
+        ),
+    ]
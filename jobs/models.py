@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Sum
 from customers.models import Customer
 from photographers.models import Photographer, AvailTime
 import datetime
@@ -15,7 +16,55 @@ JOB_STATUS_CHOICES = [('PENDING', 'Pending'),
                       ('PROCESSING', 'Processing Photos'),
                       ('COMPLETED', 'Completed'),
                       ('CLOSED', 'Closed'),
-                      ('REVIEWED', 'Reviewed')]
+                      ('REVIEWED', 'Reviewed'),
+                      ('EXPIRED', 'Expired')]
+
+# Statuses in which the photographer is holding the reserved dates for the customer
+BOOKED_JOB_STATUSES = ['MATCHED', 'PAID', 'PROCESSING', 'COMPLETED', 'CLOSED', 'REVIEWED']
+
+# Statuses a job leaves for EXPIRED once all its photoshoot dates have passed (see the expire_jobs command)
+EXPIRABLE_JOB_STATUSES = ['PENDING', 'MATCHED']
+
+# Status -> statuses a job may move to from it
+JOB_TRANSITIONS = {'PENDING': ('DECLINED', 'MATCHED', 'CANCELLED_BY_CUSTOMER'),
+                   'MATCHED': ('PAID', 'CANCELLED_BY_PHOTOGRAPHER', 'CANCELLED_BY_CUSTOMER'),
+                   'PAID': ('PROCESSING', 'CANCELLED_BY_PHOTOGRAPHER', 'CANCELLED_BY_CUSTOMER'),
+                   'PROCESSING': ('COMPLETED',),
+                   'COMPLETED': ('CLOSED',),
+                   'CLOSED': ('REVIEWED',),
+                   'DECLINED': (),
+                   'CANCELLED_BY_PHOTOGRAPHER': (),
+                   'CANCELLED_BY_CUSTOMER': (),
+                   'REVIEWED': (),
+                   'EXPIRED': ()}
+
+# Why a job in one of these statuses cannot move at all
+JOB_FINAL_STATUS_ERRORS = {'DECLINED': 'The job has already been cancelled or declined',
+                           'CANCELLED_BY_PHOTOGRAPHER': 'The job has already been cancelled or declined',
+                           'CANCELLED_BY_CUSTOMER': 'The job has already been cancelled or declined',
+                           'REVIEWED': 'This job is done',
+                           'EXPIRED': 'The job has expired'}
+
+# New status -> (notification action, who acted); the other party receives the notification
+JOB_STATUS_NOTIFICATIONS = {'DECLINED': ('UPDATE', 'photographer'),
+                            'MATCHED': ('UPDATE', 'photographer'),
+                            'PAID': ('UPDATE', 'customer'),
+                            'PROCESSING': ('UPDATE', 'photographer'),
+                            'COMPLETED': ('UPDATE', 'photographer'),
+                            'CLOSED': ('UPDATE', 'customer'),
+                            'REVIEWED': ('UPDATE', 'customer'),
+                            'CANCELLED_BY_PHOTOGRAPHER': ('CANCEL', 'photographer'),
+                            'CANCELLED_BY_CUSTOMER': ('CANCEL', 'customer'),
+                            'EXPIRED': ('CANCEL', 'photographer')}
+
+
+def transition_error(current_status, new_status):
+    # None when JOB_TRANSITIONS allows the move, otherwise the message to show
+    if current_status in JOB_FINAL_STATUS_ERRORS:
+        return JOB_FINAL_STATUS_ERRORS[current_status]
+    if new_status not in JOB_TRANSITIONS.get(current_status, ()):
+        return 'The job cannot be updated to this status'
+    return None
 
 TIME_CHOICES = [('HALF_DAY_MORNING', "Half-day(Morning-Noon)"),
                      ('HALF_DAY_NOON', "Half-day(Noon-Evening)"),
@@ -23,6 +72,21 @@ TIME_CHOICES = [('HALF_DAY_MORNING', "Half-day(Morning-Noon)"),
                      ('NIGHT', "Night"),
                      ('FULL_DAY_NIGHT', "Full-Day and Night")]
 
+# Parts of the day each photoshoot time occupies, overlapping times share a bit
+SLOT_MASKS = {'HALF_DAY_MORNING': 1,
+              'HALF_DAY_NOON': 2,
+              'FULL_DAY': 3,
+              'NIGHT': 4,
+              'FULL_DAY_NIGHT': 7}
+
+
+def occupancy_masks(reservations):
+    # (photoshoot_date, photoshoot_time) pairs -> {date: occupied mask}
+    masks = {}
+    for photoshoot_date, photoshoot_time in reservations:
+        masks[photoshoot_date] = masks.get(photoshoot_date, 0) | SLOT_MASKS[photoshoot_time]
+    return masks
+
 STYLE_CHOICES = [('GRADUATION', 'Graduation'),
                  ('LANDSCAPE', 'Landscape'),
                  ('PORTRAIT', 'Portrait'),
@@ -33,7 +97,7 @@ STYLE_CHOICES = [('GRADUATION', 'Graduation'),
                  ('NONE', 'None')]
 
 class JobReservation(models.Model):
-    photoshoot_date = models.DateField()
+    photoshoot_date = models.DateField(db_index=True)
     photoshoot_time = models.CharField(choices=TIME_CHOICES, max_length=20)
     job_avail_time = models.ForeignKey(AvailTime, related_name='photographer_avail_time', on_delete=models.CASCADE)
 
@@ -41,7 +105,6 @@ class JobReservation(models.Model):
         return str(self.photoshoot_date) + ' ' + self.photoshoot_time
 
 class JobInfo(models.Model):
-    # TODO write function to calculate Job Total price
     # TODO not allow job bookings from customers to photographers
     #  whose status is already past 'matched' for that time period
     job_id = models.AutoField(primary_key=True)
@@ -56,9 +119,82 @@ class JobInfo(models.Model):
     job_special_requirement = models.CharField(max_length=400, blank=True, null=True)
     job_reservation = models.ManyToManyField(JobReservation, null=True)
     job_url = models.URLField(max_length = 200, null=True, blank=True)
+    # Sum of the reserved slots' prices, kept up to date by jobs.signals
+    job_total_price = models.FloatField(null=True, blank=True)
 
     # is_reviewed
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['job_photographer', 'job_status'], name='job_photographer_status_idx'),
+        ]
+
     def __str__(self):
         return self.job_title + '\n' + self.job_customer.profile.user.first_name + " " + self.job_photographer.profile.user.first_name
-    
\ No newline at end of file
+
+    @classmethod
+    def refresh_total_price(cls, job_ids):
+        # Recompute job_total_price of the given jobs, NULL for a job without reservations
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        totals = cls.objects.filter(pk__in=job_ids) \
+            .annotate(total=Sum('job_reservation__job_avail_time__photographer_price')).values_list('pk', 'total')
+        cls.objects.bulk_update([cls(pk=pk, job_total_price=total) for pk, total in totals], ['job_total_price'])
+    
+
+class SlotOccupancy(models.Model):
+    # The parts of a photographer's day held by booked jobs (see BOOKED_JOB_STATUSES) as a
+    # SLOT_MASKS bitmask, one row per (photographer, date). Written only with the rows locked.
+    photographer = models.ForeignKey(Photographer, related_name='slot_occupancy', on_delete=models.CASCADE)
+    occupancy_date = models.DateField()
+    occupied_mask = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Slot occupancy'
+        constraints = [
+            models.UniqueConstraint(fields=['photographer', 'occupancy_date'], name='slot_occupancy_photographer_date_uniq'),
+        ]
+
+    def __str__(self):
+        return str(self.photographer) + ' ' + str(self.occupancy_date) + ' ' + str(self.occupied_mask)
+
+    @classmethod
+    def occupied(cls, photographer_id, dates):
+        # {date: occupied mask} for the photographer's `dates`, one indexed lookup
+        return dict(cls.objects.filter(photographer_id=photographer_id, occupancy_date__in=list(dates))
+                    .values_list('occupancy_date', 'occupied_mask'))
+
+    @classmethod
+    def _lock(cls, photographer_id, dates):
+        return {row.occupancy_date: row for row in
+                cls.objects.select_for_update().filter(photographer_id=photographer_id, occupancy_date__in=dates)}
+
+    @classmethod
+    def occupy(cls, photographer_id, masks):
+        # Mark `masks` as occupied unless any of it overlaps, returns the conflicting dates.
+        # Run inside a transaction: the rows stay locked until it ends.
+        if not masks:
+            return set()
+        dates = list(masks)
+        rows = cls._lock(photographer_id, dates)
+        if len(rows) < len(dates):
+            # the unique constraint lets concurrent bookings of a new date insert it only once
+            cls.objects.bulk_create([cls(photographer_id=photographer_id, occupancy_date=occupancy_date)
+                                     for occupancy_date in dates if occupancy_date not in rows], ignore_conflicts=True)
+            rows = cls._lock(photographer_id, dates)
+        conflicts = {occupancy_date for occupancy_date, row in rows.items() if row.occupied_mask & masks[occupancy_date]}
+        if conflicts:
+            return conflicts
+        for occupancy_date, row in rows.items():
+            row.occupied_mask |= masks[occupancy_date]
+        cls.objects.bulk_update(list(rows.values()), ['occupied_mask'])
+        return set()
+
+    @classmethod
+    def release(cls, photographer_id, masks):
+        # Free `masks` again, e.g. when a booked job is cancelled. Run inside a transaction.
+        rows = cls._lock(photographer_id, list(masks)) if masks else {}
+        for occupancy_date, row in rows.items():
+            row.occupied_mask &= ~masks[occupancy_date]
+        cls.objects.bulk_update(list(rows.values()), ['occupied_mask'])
@@ -0,0 +1,47 @@
+from django.db.models.signals import pre_delete, post_delete, post_save, m2m_changed
+from django.dispatch import receiver
+
+from photographers.models import AvailTime
+from .models import JobInfo, JobReservation
+
+
+@receiver(m2m_changed, sender=JobInfo.job_reservation.through)
+def refresh_total_price_on_reservations(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # a reservation added to / removed from jobs; a clear has no pk_set, remember the jobs first
+        if action == 'pre_clear':
+            instance._total_price_jobs = list(instance.jobinfo_set.values_list('pk', flat=True))
+        elif action == 'post_clear':
+            JobInfo.refresh_total_price(getattr(instance, '_total_price_jobs', []))
+        elif action in ('post_add', 'post_remove'):
+            JobInfo.refresh_total_price(pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        JobInfo.refresh_total_price([instance.pk])
+
+
+@receiver(post_save, sender=JobReservation)
+def refresh_total_price_on_reservation_change(sender, instance, created, raw=False, **kwargs):
+    # a new reservation belongs to no job yet
+    if created or raw:
+        return
+    JobInfo.refresh_total_price(instance.jobinfo_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=JobReservation)
+def remember_reservation_jobs(sender, instance, **kwargs):
+    # the through rows are gone by post_delete
+    instance._total_price_jobs = list(instance.jobinfo_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=JobReservation)
+def refresh_total_price_on_reservation_delete(sender, instance, **kwargs):
+    JobInfo.refresh_total_price(getattr(instance, '_total_price_jobs', []))
+
+
+@receiver(post_save, sender=AvailTime)
+def refresh_total_price_on_slot_price(sender, instance, created, raw=False, **kwargs):
+    # AvailTime rows are shared, so a price edit moves every job reserving the row
+    if created or raw:
+        return
+    JobInfo.refresh_total_price(JobInfo.objects.filter(job_reservation__job_avail_time=instance)
+                                .values_list('pk', flat=True).distinct())
@@ -1,3 +1,165 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from customers.models import Customer
+from photographers.models import Photographer, AvailTime
+from users.models import CustomUser, CustomUserProfile
+from .models import JobInfo, SlotOccupancy, SLOT_MASKS, occupancy_masks
+
+
+def make_profile(username, user_type):
+    user = CustomUser.objects.create_user(username=username, password='pw12345!', user_type=user_type)
+    return CustomUserProfile.objects.create(user=user)
+
+
+def make_photographer(username, slots):
+    # a photographer working `slots` on Mondays
+    photographer = Photographer.objects.create(profile=make_profile(username, 1))
+    photographer.photographer_avail_time.add(*[AvailTime.objects.create(avail_date='MONDAY', avail_time=slot,
+                                                                        photographer_price=100)
+                                               for slot in slots])
+    return photographer
+
+
+def next_monday():
+    today = datetime.date.today()
+    return today + datetime.timedelta(days=7 - today.weekday())
+
+
+class OccupancyMasksTests(SimpleTestCase):
+
+    def test_full_day_overlaps_both_half_days_but_not_night(self):
+        self.assertTrue(SLOT_MASKS['FULL_DAY'] & SLOT_MASKS['HALF_DAY_MORNING'])
+        self.assertTrue(SLOT_MASKS['FULL_DAY'] & SLOT_MASKS['HALF_DAY_NOON'])
+        self.assertFalse(SLOT_MASKS['FULL_DAY'] & SLOT_MASKS['NIGHT'])
+        self.assertFalse(SLOT_MASKS['HALF_DAY_MORNING'] & SLOT_MASKS['HALF_DAY_NOON'])
+
+    def test_full_day_night_overlaps_everything(self):
+        for slot, mask in SLOT_MASKS.items():
+            self.assertTrue(SLOT_MASKS['FULL_DAY_NIGHT'] & mask, slot)
+
+    def test_masks_are_merged_per_date(self):
+        monday, tuesday = datetime.date(2030, 1, 7), datetime.date(2030, 1, 8)
+        masks = occupancy_masks([(monday, 'HALF_DAY_MORNING'), (monday, 'NIGHT'), (tuesday, 'HALF_DAY_NOON')])
+        self.assertEqual(masks, {monday: SLOT_MASKS['HALF_DAY_MORNING'] | SLOT_MASKS['NIGHT'],
+                                 tuesday: SLOT_MASKS['HALF_DAY_NOON']})
+
+
+class SlotOccupancyTests(TestCase):
+
+    def setUp(self):
+        self.photographer = make_photographer('bob', ['FULL_DAY'])
+        self.date = datetime.date(2030, 1, 7)
+
+    def occupy(self, masks):
+        with transaction.atomic():
+            return SlotOccupancy.occupy(self.photographer.pk, masks)
+
+    def release(self, masks):
+        with transaction.atomic():
+            SlotOccupancy.release(self.photographer.pk, masks)
+
+    def test_occupy_records_the_mask(self):
+        self.assertEqual(self.occupy({self.date: SLOT_MASKS['HALF_DAY_MORNING']}), set())
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]),
+                         {self.date: SLOT_MASKS['HALF_DAY_MORNING']})
+
+    def test_disjoint_slots_share_a_date(self):
+        self.assertEqual(self.occupy({self.date: SLOT_MASKS['HALF_DAY_MORNING']}), set())
+        self.assertEqual(self.occupy({self.date: SLOT_MASKS['HALF_DAY_NOON']}), set())
+        self.assertEqual(self.occupy({self.date: SLOT_MASKS['NIGHT']}), set())
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]),
+                         {self.date: SLOT_MASKS['FULL_DAY_NIGHT']})
+
+    def test_overlapping_slot_is_refused_and_nothing_is_written(self):
+        other_date = self.date + datetime.timedelta(days=7)
+        self.occupy({self.date: SLOT_MASKS['FULL_DAY']})
+        conflicts = self.occupy({self.date: SLOT_MASKS['HALF_DAY_MORNING'], other_date: SLOT_MASKS['NIGHT']})
+        self.assertEqual(conflicts, {self.date})
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date, other_date]),
+                         {self.date: SLOT_MASKS['FULL_DAY'], other_date: 0})
+
+    def test_release_frees_only_the_given_slots(self):
+        self.occupy({self.date: SLOT_MASKS['HALF_DAY_MORNING'] | SLOT_MASKS['NIGHT']})
+        self.release({self.date: SLOT_MASKS['HALF_DAY_MORNING']})
+        self.assertEqual(SlotOccupancy.occupied(self.photographer.pk, [self.date]), {self.date: SLOT_MASKS['NIGHT']})
+        self.assertEqual(self.occupy({self.date: SLOT_MASKS['FULL_DAY']}), set())
+
+    def test_photographers_do_not_share_slots(self):
+        other = make_photographer('ann', ['FULL_DAY'])
+        self.occupy({self.date: SLOT_MASKS['FULL_DAY']})
+        with transaction.atomic():
+            self.assertEqual(SlotOccupancy.occupy(other.pk, {self.date: SLOT_MASKS['FULL_DAY']}), set())
+
+
+class JobBookingTests(TestCase):
+    # The ledger as seen through /api/jobs/
+
+    def setUp(self):
+        self.photographer = make_photographer('bob', ['HALF_DAY_MORNING', 'HALF_DAY_NOON', 'FULL_DAY', 'NIGHT'])
+        self.customer = Customer.objects.create(profile=make_profile('carol', 2))
+        self.date = next_monday()
+        self.client = APIClient()
+        self.client.force_authenticate(user=CustomUser.objects.create_superuser('admin', 'pw12345!'))
+
+    def book(self, slot):
+        return self.client.post('/api/jobs/', {
+            'job_title': 'Photoshoot', 'job_description': '', 'job_customer': 'carol', 'job_photographer': 'bob',
+            'job_style': 'NONE', 'job_location': 'Bangkok', 'job_expected_complete_date': str(self.date),
+            'job_special_requirement': '',
+            'job_reservation': [{'photoshoot_date': str(self.date), 'photoshoot_time': slot,
+                                 'job_avail_time': {'avail_date': 'MONDAY', 'avail_time': slot,
+                                                    'photographer_price': 100}}]}, format='json')
+
+    def set_status(self, job_id, job_status):
+        return self.client.patch('/api/jobs/%d/' % job_id, {'job_status': job_status}, format='json')
+
+    def occupied_mask(self):
+        return SlotOccupancy.occupied(self.photographer.pk, [self.date]).get(self.date, 0)
+
+    def test_pending_jobs_do_not_hold_slots(self):
+        self.assertEqual(self.book('FULL_DAY').status_code, 201)
+        self.assertEqual(self.book('HALF_DAY_MORNING').status_code, 201)
+        self.assertEqual(self.occupied_mask(), 0)
+
+    def test_matched_job_holds_its_slots(self):
+        job_id = self.book('FULL_DAY').data['job_id']
+        self.assertEqual(self.set_status(job_id, 'MATCHED').status_code, 200)
+        self.assertEqual(self.occupied_mask(), SLOT_MASKS['FULL_DAY'])
+
+    def test_booking_overlapping_a_matched_job_is_refused(self):
+        job_id = self.book('FULL_DAY').data['job_id']
+        self.set_status(job_id, 'MATCHED')
+        response = self.book('HALF_DAY_MORNING')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, ['The photographer is not available on your selected date and time'])
+        self.assertEqual(self.book('NIGHT').status_code, 201)
+
+    def test_matching_an_overlapping_job_is_refused(self):
+        full_day = self.book('FULL_DAY').data['job_id']
+        half_day = self.book('HALF_DAY_NOON').data['job_id']
+        self.set_status(full_day, 'MATCHED')
+        response = self.set_status(half_day, 'MATCHED')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(JobInfo.objects.get(pk=half_day).job_status, 'PENDING')
+        self.assertEqual(self.occupied_mask(), SLOT_MASKS['FULL_DAY'])
+
+    def test_cancelling_a_booked_job_releases_its_slots(self):
+        full_day = self.book('FULL_DAY').data['job_id']
+        half_day = self.book('HALF_DAY_MORNING').data['job_id']
+        self.set_status(full_day, 'MATCHED')
+        self.set_status(full_day, 'PAID')
+        self.assertEqual(self.set_status(full_day, 'CANCELLED_BY_PHOTOGRAPHER').status_code, 200)
+        self.assertEqual(self.occupied_mask(), 0)
+        self.assertEqual(self.set_status(half_day, 'MATCHED').status_code, 200)
+        self.assertEqual(self.occupied_mask(), SLOT_MASKS['HALF_DAY_MORNING'])
+
+    def test_declining_a_pending_job_leaves_the_ledger_alone(self):
+        matched = self.book('NIGHT').data['job_id']
+        pending = self.book('FULL_DAY').data['job_id']
+        self.set_status(matched, 'MATCHED')
+        self.assertEqual(self.set_status(pending, 'DECLINED').status_code, 200)
+        self.assertEqual(self.occupied_mask(), SLOT_MASKS['NIGHT'])
@@ -15,7 +15,8 @@ NOTI_STATUS_CHOICES = [('PENDING', 'Pending'),
                       ('PROCESSING', 'Processing Photos'),
                       ('COMPLETED', 'Completed'),
                       ('CLOSED', 'Closed'),
-                      ('REVIEWED', 'Reviewed')]
+                      ('REVIEWED', 'Reviewed'),
+                      ('EXPIRED', 'Expired')]
 
 NOTI_READ_CHOICES = [('UNREAD', 'Unread'),
                       ('READ', 'Read')]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Photographer, Photo, AvailTime, Equipment, Style
+from .models import Photographer, Photo, AvailTime, Equipment, Style, PhotographerPriceStats, PhotographerEquipmentIndex
 
 admin.site.register(Photographer)
 admin.site.register(Style)
@@ -8,3 +8,5 @@ admin.site.register(AvailTime)
 admin.site.register(Equipment)
 
 # Register your models here.
+admin.site.register(PhotographerPriceStats)
+admin.site.register(PhotographerEquipmentIndex)
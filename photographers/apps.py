@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PhotographersConfig(AppConfig):
     name = 'photographers'
+
+    def ready(self):
+        from . import signals
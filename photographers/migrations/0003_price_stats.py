@@ -0,0 +1,64 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_price_stats(apps, schema_editor):
+    Photographer = apps.get_model('photographers', 'Photographer')
+    PhotographerPriceStats = apps.get_model('photographers', 'PhotographerPriceStats')
+    PhotographerSlotPrice = apps.get_model('photographers', 'PhotographerSlotPrice')
+    prices = {pk: [] for pk in Photographer.objects.values_list('pk', flat=True)}
+    slot_prices = []
+    slots = Photographer.photographer_avail_time.through.objects.values_list(
+        'photographer_id', 'availtime__avail_date', 'availtime__avail_time', 'availtime__photographer_price')
+    for photographer_id, avail_date, avail_time, price in slots.iterator():
+        prices[photographer_id].append(price)
+        slot_prices.append(PhotographerSlotPrice(photographer_id=photographer_id, avail_date=avail_date,
+                                                 avail_time=avail_time, photographer_price=price))
+    stats = [PhotographerPriceStats(photographer_id=pk,
+                                    price_min=min(values) if values else None,
+                                    price_avg=sum(values) / len(values) if values else None,
+                                    price_max=max(values) if values else None)
+             for pk, values in prices.items()]
+    PhotographerPriceStats.objects.bulk_create(stats, batch_size=1000)
+    PhotographerSlotPrice.objects.bulk_create(slot_prices, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0002_photographer_style'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotographerPriceStats',
+            fields=[
+                ('photographer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price_stats', serialize=False, to='photographers.Photographer')),
+                ('price_min', models.FloatField(blank=True, db_index=True, null=True)),
+                ('price_avg', models.FloatField(blank=True, db_index=True, null=True)),
+                ('price_max', models.FloatField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Photographer price stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='PhotographerSlotPrice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avail_date', models.CharField(choices=[('SUNDAY', 'Sunday'), ('MONDAY', 'Monday'), ('TUESDAY', 'Tuesday'), ('WEDNESDAY', 'Wednesday'), ('THURSDAY', 'Thursday'), ('FRIDAY', 'Friday'), ('SATURDAY', 'Saturday')], max_length=20)),
+                ('avail_time', models.CharField(choices=[('HALF_DAY_MORNING', 'Half-day(Morning-Noon)'), ('HALF_DAY_NOON', 'Half-day(Noon-Evening)'), ('FULL_DAY', 'Full-Day'), ('NIGHT', 'Night'), ('FULL_DAY_NIGHT', 'Full-Day and Night')], max_length=16)),
+                ('photographer_price', models.FloatField()),
+                ('photographer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_prices', to='photographers.Photographer')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='photographerslotprice',
+            index=models.Index(fields=['photographer', 'photographer_price'], name='slot_price_photographer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photographerslotprice',
+            index=models.Index(fields=['avail_date', 'avail_time', 'photographer_price'], name='slot_price_day_time_idx'),
+        ),
+        migrations.RunPython(build_price_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+
+# Frozen copy of photographers.models.pack_availability as of this migration, so later
+# changes to the live helper do not change what the migration does
+DAYS = ('SUNDAY', 'MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY')
+TIMES = ('HALF_DAY_MORNING', 'HALF_DAY_NOON', 'FULL_DAY', 'NIGHT', 'FULL_DAY_NIGHT')
+
+
+def pack_availability(slots):
+    prices = {}
+    for avail_date, avail_time, price in slots:
+        bit = 1 << (DAYS.index(avail_date) * len(TIMES) + TIMES.index(avail_time))
+        prices[bit] = min(price, prices.get(bit, price))
+    return sum(prices), ','.join(repr(float(prices[bit])) for bit in sorted(prices))
+
+
+def pack_avail_times(apps, schema_editor):
+    Photographer = apps.get_model('photographers', 'Photographer')
+    weekly = {pk: [] for pk in Photographer.objects.values_list('pk', flat=True)}
+    slots = Photographer.photographer_avail_time.through.objects.values_list(
+        'photographer_id', 'availtime__avail_date', 'availtime__avail_time', 'availtime__photographer_price')
+    for photographer_id, avail_date, avail_time, price in slots.iterator():
+        weekly[photographer_id].append((avail_date, avail_time, price))
+    packed = []
+    for pk, photographer_slots in weekly.items():
+        bits, prices = pack_availability(photographer_slots)
+        packed.append(Photographer(pk=pk, photographer_avail_bits=bits, photographer_avail_prices=prices))
+    Photographer.objects.bulk_update(packed, ['photographer_avail_bits', 'photographer_avail_prices'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0003_price_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photographer',
+            name='photographer_avail_bits',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='photographer',
+            name='photographer_avail_prices',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(pack_avail_times, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copies of photographers.models.pack_styles and equipment_key as of this migration,
+# so later changes to the live helpers do not change what the migration does
+STYLES = ('GRADUATION', 'LANDSCAPE', 'PORTRAIT', 'PRODUCT', 'FASHION', 'EVENT', 'WEDDING', 'NONE')
+
+
+def pack_styles(style_names):
+    return sum({1 << STYLES.index(name) for name in style_names})
+
+
+def equipment_key(equipment_name):
+    return equipment_name.strip().lower()
+
+
+def build_style_bits_and_equipment_index(apps, schema_editor):
+    Photographer = apps.get_model('photographers', 'Photographer')
+    PhotographerEquipmentIndex = apps.get_model('photographers', 'PhotographerEquipmentIndex')
+    styles = {pk: [] for pk in Photographer.objects.values_list('pk', flat=True)}
+    for photographer_id, style_name in Photographer.photographer_style.through.objects \
+            .values_list('photographer_id', 'style_id').iterator():
+        styles[photographer_id].append(style_name)
+    Photographer.objects.bulk_update([Photographer(pk=pk, photographer_style_bits=pack_styles(names))
+                                      for pk, names in styles.items()], ['photographer_style_bits'], batch_size=1000)
+
+    rows = {(equipment_key(name), photographer_id) for photographer_id, name in
+            Photographer.photographer_equipment.through.objects.values_list('photographer_id', 'equipment_id').iterator()}
+    PhotographerEquipmentIndex.objects.bulk_create([PhotographerEquipmentIndex(equipment_key=key, photographer_id=pk)
+                                                    for key, pk in rows], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0004_photographer_avail_bits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photographer',
+            name='photographer_style_bits',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='PhotographerEquipmentIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_key', models.CharField(max_length=100)),
+                ('photographer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='equipment_index', to='photographers.Photographer')),
+            ],
+            options={
+                'verbose_name_plural': 'Photographer equipment index',
+                'unique_together': {('equipment_key', 'photographer')},
+            },
+        ),
+        migrations.RunPython(build_style_bits_and_equipment_index, migrations.RunPython.noop),
+    ]
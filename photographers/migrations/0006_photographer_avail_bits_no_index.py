@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0005_style_bits_equipment_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photographer',
+            name='photographer_avail_bits',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0006_photographer_avail_bits_no_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photographer',
+            name='photographer_style_bits',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import CustomUserProfile
 # Create your models here.
 
@@ -26,6 +26,46 @@ TIME_CHOICES = [('HALF_DAY_MORNING', "Half-day(Morning-Noon)"),
                      ('NIGHT', "Night"),
                      ('FULL_DAY_NIGHT', "Full-Day and Night")]
 
+# Weekly availability as a bitset: one bit per (day, slot), day-major in DAY_CHOICES/TIME_CHOICES order
+SLOTS_PER_DAY = len(TIME_CHOICES)
+DAY_INDEX = {key: i for i, (key, _) in enumerate(DAY_CHOICES)}
+TIME_INDEX = {key: i for i, (key, _) in enumerate(TIME_CHOICES)}
+STYLE_INDEX = {key: i for i, (key, _) in enumerate(STYLE_CHOICES)}
+
+
+def avail_bit(avail_date, avail_time):
+    return 1 << (DAY_INDEX[avail_date] * SLOTS_PER_DAY + TIME_INDEX[avail_time])
+
+
+def day_bits(avail_date):
+    return ((1 << SLOTS_PER_DAY) - 1) << (DAY_INDEX[avail_date] * SLOTS_PER_DAY)
+
+
+def time_bits(avail_time):
+    return sum(1 << (day * SLOTS_PER_DAY + TIME_INDEX[avail_time]) for day in range(len(DAY_CHOICES)))
+
+
+def style_bit(style_name):
+    return 1 << STYLE_INDEX[style_name]
+
+
+def pack_styles(style_names):
+    return sum({style_bit(name) for name in style_names})
+
+
+def equipment_key(equipment_name):
+    return equipment_name.strip().lower()
+
+
+def pack_availability(slots):
+    # [(avail_date, avail_time, price)] -> (bitmask, prices of the set bits in bit order, comma separated).
+    # A slot listed twice keeps its lowest price.
+    prices = {}
+    for avail_date, avail_time, price in slots:
+        bit = avail_bit(avail_date, avail_time)
+        prices[bit] = min(price, prices.get(bit, price))
+    return sum(prices), ','.join(repr(float(prices[bit])) for bit in sorted(prices))
+
 
 class Photo(models.Model):
     photo_link = models.URLField(primary_key=True, unique=True)
@@ -73,8 +113,137 @@ class Photographer(models.Model):
     photographer_avail_time = models.ManyToManyField(AvailTime, blank=True, null=True)
     photographer_equipment = models.ManyToManyField(Equipment,related_name='photographer_equipment', null=True, blank=True)
     photographer_photos = models.ManyToManyField(Photo, related_name='photographer_photos', null=True, blank=True)
+    # Weekly availability packed from photographer_avail_time (see pack_availability), kept by PhotographerPriceStats.refresh.
+    # Not indexed: it is only ever filtered with bitand(), which no B-tree index serves
+    photographer_avail_bits = models.BigIntegerField(default=0)
+    photographer_avail_prices = models.TextField(blank=True, default='')
+    # Styles packed from photographer_style (see style_bit), kept by refresh_style_bits. Not indexed, like the availability
+    photographer_style_bits = models.IntegerField(default=0)
 
     def __str__(self):
         return self.profile.user.username
 
+    @classmethod
+    def refresh_style_bits(cls, photographer_ids):
+        styles = {pk: [] for pk in photographer_ids}
+        for photographer_id, style_name in cls.photographer_style.through.objects \
+                .filter(photographer_id__in=list(styles)).values_list('photographer_id', 'style_id'):
+            styles[photographer_id].append(style_name)
+        cls.objects.bulk_update([cls(pk=pk, photographer_style_bits=pack_styles(names)) for pk, names in styles.items()],
+                                ['photographer_style_bits'])
+
+    def is_available(self, avail_date, avail_time):
+        return bool(self.photographer_avail_bits & avail_bit(avail_date, avail_time))
 
+    def slot_price(self, avail_date, avail_time):
+        # The price of one slot: its position in photographer_avail_prices is the number of set bits below it
+        bit = avail_bit(avail_date, avail_time)
+        if not self.photographer_avail_bits & bit:
+            return None
+        return float(self.photographer_avail_prices.split(',')[bin(self.photographer_avail_bits & (bit - 1)).count('1')])
+
+
+class PhotographerPriceStats(models.Model):
+    # Min/avg/max over a photographer's AvailTime prices, see refresh()
+    photographer = models.OneToOneField(Photographer, on_delete=models.CASCADE, primary_key=True, related_name='price_stats')
+    price_min = models.FloatField(null=True, blank=True, db_index=True)
+    price_avg = models.FloatField(null=True, blank=True, db_index=True)
+    price_max = models.FloatField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Photographer price stats"
+
+    def __str__(self):
+        return str(self.photographer_id) + ' ' + str(self.price_min) + '-' + str(self.price_max)
+
+    @classmethod
+    def refresh(cls, photographer_ids):
+        # Rebuild the price stats, slot prices and packed weekly availability of the given
+        # photographers from their current photographer_avail_time rows.
+        photographer_ids = list(photographer_ids)
+        Through = Photographer.photographer_avail_time.through
+        slots = Through.objects.filter(photographer_id__in=photographer_ids).values_list(
+            'photographer_id', 'availtime__avail_date', 'availtime__avail_time', 'availtime__photographer_price')
+
+        weekly = {pk: [] for pk in photographer_ids}
+        for photographer_id, avail_date, avail_time, price in slots:
+            weekly[photographer_id].append((avail_date, avail_time, price))
+        packed = []
+        for pk, photographer_slots in weekly.items():
+            bits, avail_prices = pack_availability(photographer_slots)
+            packed.append(Photographer(pk=pk, photographer_avail_bits=bits, photographer_avail_prices=avail_prices))
+
+        with transaction.atomic():
+            cls.store(weekly)
+            Photographer.objects.bulk_update(packed, ['photographer_avail_bits', 'photographer_avail_prices'])
+
+    @classmethod
+    def store(cls, weekly, replace=True):
+        # Write the price stats and slot prices of {photographer_id: [(avail_date, avail_time, price)]},
+        # replacing the existing rows unless the photographers are new
+        stats = []
+        slot_prices = []
+        for pk, photographer_slots in weekly.items():
+            values = [price for _, _, price in photographer_slots]
+            stats.append(cls(photographer_id=pk,
+                             price_min=min(values) if values else None,
+                             price_avg=sum(values) / len(values) if values else None,
+                             price_max=max(values) if values else None))
+            slot_prices.extend(PhotographerSlotPrice(photographer_id=pk, avail_date=avail_date,
+                                                     avail_time=avail_time, photographer_price=price)
+                               for avail_date, avail_time, price in photographer_slots)
+
+        with transaction.atomic():
+            if replace:
+                cls.objects.filter(photographer_id__in=list(weekly)).delete()
+                PhotographerSlotPrice.objects.filter(photographer_id__in=list(weekly)).delete()
+            cls.objects.bulk_create(stats)
+            PhotographerSlotPrice.objects.bulk_create(slot_prices)
+
+
+class PhotographerSlotPrice(models.Model):
+    # A photographer's price per (day, slot), without going through the shared AvailTime rows
+    photographer = models.ForeignKey(Photographer, on_delete=models.CASCADE, related_name='slot_prices')
+    avail_date = models.CharField(max_length=20, choices=DAY_CHOICES)
+    avail_time = models.CharField(max_length=16, choices=TIME_CHOICES)
+    photographer_price = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['photographer', 'photographer_price'], name='slot_price_photographer_idx'),
+            models.Index(fields=['avail_date', 'avail_time', 'photographer_price'], name='slot_price_day_time_idx'),
+        ]
+
+    def __str__(self):
+        return self.avail_date + " " + self.avail_time + " " + str(self.photographer_price)
+
+
+class PhotographerEquipmentIndex(models.Model):
+    # Inverted index equipment -> photographers on normalized names (see equipment_key), kept by refresh()
+    equipment_key = models.CharField(max_length=100)
+    photographer = models.ForeignKey(Photographer, on_delete=models.CASCADE, related_name='equipment_index')
+
+    class Meta:
+        unique_together = ('equipment_key', 'photographer')
+        verbose_name_plural = "Photographer equipment index"
+
+    def __str__(self):
+        return self.equipment_key + " " + str(self.photographer_id)
+
+    @classmethod
+    def refresh(cls, photographer_ids):
+        # Replace the index rows of the given photographers from their photographer_equipment
+        photographer_ids = list(photographer_ids)
+        names = Photographer.photographer_equipment.through.objects.filter(photographer_id__in=photographer_ids) \
+            .values_list('photographer_id', 'equipment_id')
+        with transaction.atomic():
+            cls.objects.filter(photographer_id__in=photographer_ids).delete()
+            cls.store(names)
+
+    @classmethod
+    def store(cls, names):
+        # Add index rows for [(photographer_id, equipment_name)]
+        rows = {(equipment_key(name), photographer_id) for photographer_id, name in names}
+        # case-insensitive collations (MySQL) may fold distinct keys together
+        cls.objects.bulk_create([cls(equipment_key=key, photographer_id=photographer_id)
+                                 for key, photographer_id in rows], ignore_conflicts=True)
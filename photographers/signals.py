@@ -0,0 +1,56 @@
+from django.db.models.signals import post_save, m2m_changed
+from django.dispatch import receiver
+
+from .models import AvailTime, Photographer, PhotographerPriceStats, PhotographerEquipmentIndex
+
+
+@receiver(post_save, sender=AvailTime)
+def refresh_shared_slot_prices(sender, instance, created, raw=False, **kwargs):
+    # AvailTime rows are shared, so a price edit moves every photographer using the row
+    if created or raw:
+        return
+    PhotographerPriceStats.refresh(instance.photographer_set.values_list('pk', flat=True))
+
+
+# The packed columns and index rows derived from the M2M fields are rebuilt whoever changes
+# the relation (serializers, admin, shell, scripts)
+
+def changed_photographers(field, instance, action, reverse, pk_set):
+    # Photographers whose `field` relation has just been written, None on the other actions
+    if not reverse:
+        return [instance.pk] if action in ('post_add', 'post_remove', 'post_clear') else None
+    # rows added to / removed from photographers; a clear has no pk_set, remember the photographers first
+    if action == 'pre_clear':
+        instance._changed_photographers = list(Photographer.objects.filter(**{field: instance})
+                                               .values_list('pk', flat=True))
+    elif action == 'post_clear':
+        return getattr(instance, '_changed_photographers', [])
+    elif action in ('post_add', 'post_remove'):
+        return list(pk_set)
+    return None
+
+
+@receiver(m2m_changed, sender=Photographer.photographer_avail_time.through)
+def refresh_packed_availability(sender, instance, action, reverse, pk_set, **kwargs):
+    photographer_ids = changed_photographers('photographer_avail_time', instance, action, reverse, pk_set)
+    if photographer_ids is not None:
+        PhotographerPriceStats.refresh(photographer_ids)
+        if not reverse:
+            # so a later instance.save() does not write the old packed values back
+            instance.refresh_from_db(fields=['photographer_avail_bits', 'photographer_avail_prices'])
+
+
+@receiver(m2m_changed, sender=Photographer.photographer_style.through)
+def refresh_packed_styles(sender, instance, action, reverse, pk_set, **kwargs):
+    photographer_ids = changed_photographers('photographer_style', instance, action, reverse, pk_set)
+    if photographer_ids is not None:
+        Photographer.refresh_style_bits(photographer_ids)
+        if not reverse:
+            instance.refresh_from_db(fields=['photographer_style_bits'])
+
+
+@receiver(m2m_changed, sender=Photographer.photographer_equipment.through)
+def refresh_equipment_index(sender, instance, action, reverse, pk_set, **kwargs):
+    photographer_ids = changed_photographers('photographer_equipment', instance, action, reverse, pk_set)
+    if photographer_ids is not None:
+        PhotographerEquipmentIndex.refresh(photographer_ids)
@@ -0,0 +1,59 @@
+from django.test import TestCase
+
+from users.models import CustomUser, CustomUserProfile
+from .models import Photographer, PhotographerPriceStats, PhotographerSlotPrice, PhotographerEquipmentIndex, \
+    AvailTime, Equipment, Style, avail_bit, style_bit
+
+
+def make_photographer(username):
+    user = CustomUser.objects.create_user(username=username, password='pw12345!', user_type=1)
+    return Photographer.objects.create(profile=CustomUserProfile.objects.create(user=user))
+
+
+class PackedRelationTests(TestCase):
+    # The packed columns and index rows follow the M2M fields however they are changed
+
+    def setUp(self):
+        self.photographer = make_photographer('bob')
+        self.monday = AvailTime.objects.create(avail_date='MONDAY', avail_time='FULL_DAY', photographer_price=100)
+        self.friday = AvailTime.objects.create(avail_date='FRIDAY', avail_time='NIGHT', photographer_price=300)
+
+    def packed(self, photographer):
+        photographer = Photographer.objects.get(pk=photographer.pk)
+        stats = PhotographerPriceStats.objects.get(photographer=photographer)
+        return (photographer.photographer_avail_bits, photographer.photographer_avail_prices,
+                stats.price_min, stats.price_max, PhotographerSlotPrice.objects.filter(photographer=photographer).count())
+
+    def test_set_repacks_availability(self):
+        self.photographer.photographer_avail_time.set([self.monday, self.friday])
+        self.assertEqual(self.packed(self.photographer),
+                         (avail_bit('MONDAY', 'FULL_DAY') | avail_bit('FRIDAY', 'NIGHT'), '100.0,300.0', 100, 300, 2))
+        self.photographer.photographer_avail_time.remove(self.monday)
+        self.assertEqual(self.packed(self.photographer), (avail_bit('FRIDAY', 'NIGHT'), '300.0', 300, 300, 1))
+
+    def test_save_after_a_change_keeps_the_new_packing(self):
+        self.photographer.photographer_avail_time.add(self.friday)
+        self.photographer.save()
+        self.assertEqual(self.packed(self.photographer)[0], avail_bit('FRIDAY', 'NIGHT'))
+
+    def test_changes_from_the_slot_side(self):
+        other = make_photographer('ann')
+        self.friday.photographer_set.add(self.photographer, other)
+        self.assertEqual(self.packed(other)[0], avail_bit('FRIDAY', 'NIGHT'))
+        self.friday.photographer_set.clear()
+        self.assertEqual(self.packed(self.photographer), (0, '', None, None, 0))
+        self.assertEqual(self.packed(other), (0, '', None, None, 0))
+
+    def test_styles_and_equipment(self):
+        wedding, event = Style.objects.create(style_name='WEDDING'), Style.objects.create(style_name='EVENT')
+        self.photographer.photographer_style.set([wedding, event])
+        self.photographer.photographer_equipment.add(Equipment.objects.create(equipment_name=' Canon EOS '))
+        self.photographer.refresh_from_db()
+        self.assertEqual(self.photographer.photographer_style_bits, style_bit('WEDDING') | style_bit('EVENT'))
+        self.assertEqual(list(PhotographerEquipmentIndex.objects.filter(photographer=self.photographer)
+                              .values_list('equipment_key', flat=True)), ['canon eos'])
+        event.styles.clear()
+        Equipment.objects.get(pk=' Canon EOS ').photographer_equipment.clear()
+        self.photographer.refresh_from_db()
+        self.assertEqual(self.photographer.photographer_style_bits, style_bit('WEDDING'))
+        self.assertFalse(PhotographerEquipmentIndex.objects.filter(photographer=self.photographer).exists())
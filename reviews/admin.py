@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import ReviewInfo
+from .models import ReviewInfo, ReviewStats
 
 # Register your models here.
 # TODO register to admin page
-admin.site.register(ReviewInfo)
\ No newline at end of file
+admin.site.register(ReviewInfo)
+admin.site.register(ReviewStats)
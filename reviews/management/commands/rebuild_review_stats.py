@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum, Q
+
+from photographers.models import Photographer
+from reviews.models import ReviewInfo, ReviewStats, RATE_RANGE
+
+
+class Command(BaseCommand):
+    help = 'Recompute ReviewStats for every photographer from ReviewInfo, one chunk of photographers at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        aggregates = {'review_count': Count('pk'), 'review_sum': Sum('rateJob')}
+        aggregates.update({'rate_%d' % rate: Count('pk', filter=Q(rateJob=rate)) for rate in RATE_RANGE})
+
+        last_pk = None
+        total = 0
+        while True:
+            photographers = Photographer.objects.order_by('pk')
+            if last_pk is not None:
+                photographers = photographers.filter(pk__gt=last_pk)
+            pks = list(photographers.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            rows = ReviewInfo.objects.filter(reviewJob__job_photographer__in=pks) \
+                .values('reviewJob__job_photographer').annotate(**aggregates).order_by()
+            found = {row.pop('reviewJob__job_photographer'): row for row in rows}
+
+            stats = []
+            for pk in pks:
+                row = found.get(pk, {})
+                stats_row = ReviewStats(photographer_id=pk, **row)
+                stats_row.review_avg = stats_row.review_sum / stats_row.review_count if row else None
+                stats.append(stats_row)
+
+            with transaction.atomic():
+                ReviewStats.objects.filter(photographer__in=pks).delete()
+                ReviewStats.objects.bulk_create(stats)
+            total += len(pks)
+            self.stdout.write('Rebuilt review stats for %d photographers' % total)
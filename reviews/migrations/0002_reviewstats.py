@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_review_stats(apps, schema_editor):
+    Photographer = apps.get_model('photographers', 'Photographer')
+    ReviewInfo = apps.get_model('reviews', 'ReviewInfo')
+    ReviewStats = apps.get_model('reviews', 'ReviewStats')
+    stats = {pk: ReviewStats(photographer_id=pk) for pk in Photographer.objects.values_list('pk', flat=True)}
+    for photographer_id, rate in ReviewInfo.objects.values_list('reviewJob__job_photographer_id', 'rateJob').iterator():
+        row = stats[photographer_id]
+        row.review_count += 1
+        row.review_sum += rate
+        setattr(row, 'rate_%d' % rate, getattr(row, 'rate_%d' % rate) + 1)
+    for row in stats.values():
+        row.review_avg = row.review_sum / row.review_count if row.review_count else None
+    ReviewStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photographers', '0002_photographer_style'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewStats',
+            fields=[
+                ('photographer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stats', serialize=False, to='photographers.Photographer')),
+                ('review_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('review_sum', models.PositiveIntegerField(default=0)),
+                ('review_avg', models.FloatField(blank=True, db_index=True, null=True)),
+                ('rate_0', models.PositiveIntegerField(default=0)),
+                ('rate_1', models.PositiveIntegerField(default=0)),
+                ('rate_2', models.PositiveIntegerField(default=0)),
+                ('rate_3', models.PositiveIntegerField(default=0)),
+                ('rate_4', models.PositiveIntegerField(default=0)),
+                ('rate_5', models.PositiveIntegerField(default=0)),
+                ('rate_6', models.PositiveIntegerField(default=0)),
+                ('rate_7', models.PositiveIntegerField(default=0)),
+                ('rate_8', models.PositiveIntegerField(default=0)),
+                ('rate_9', models.PositiveIntegerField(default=0)),
+                ('rate_10', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Review stats',
+            },
+        ),
+        migrations.RunPython(build_review_stats, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from jobs.models import JobInfo
+from photographers.models import Photographer
 # Create your models here.
 # TODO create model
 
+RATE_RANGE = range(0, 11)
+
 
 class ReviewInfo(models.Model):
     reviewJob = models.OneToOneField(JobInfo, limit_choices_to={'JobStatus': 'Closed'}, primary_key=True, on_delete=models.CASCADE)
@@ -13,3 +16,54 @@ class ReviewInfo(models.Model):
     def __str__(self):
         return self.reviewDetail
 
+
+class ReviewStats(models.Model):
+    # Per-photographer review summary, kept up to date by reviews.signals
+    photographer = models.OneToOneField(Photographer, primary_key=True, related_name='review_stats', on_delete=models.CASCADE)
+    review_count = models.PositiveIntegerField(default=0, db_index=True)
+    review_sum = models.PositiveIntegerField(default=0)
+    review_avg = models.FloatField(null=True, blank=True, db_index=True)
+    # Histogram of rateJob values (0-10)
+    rate_0 = models.PositiveIntegerField(default=0)
+    rate_1 = models.PositiveIntegerField(default=0)
+    rate_2 = models.PositiveIntegerField(default=0)
+    rate_3 = models.PositiveIntegerField(default=0)
+    rate_4 = models.PositiveIntegerField(default=0)
+    rate_5 = models.PositiveIntegerField(default=0)
+    rate_6 = models.PositiveIntegerField(default=0)
+    rate_7 = models.PositiveIntegerField(default=0)
+    rate_8 = models.PositiveIntegerField(default=0)
+    rate_9 = models.PositiveIntegerField(default=0)
+    rate_10 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Review stats"
+
+    def __str__(self):
+        return str(self.photographer_id) + ' ' + str(self.review_count)
+
+    @property
+    def histogram(self):
+        return [getattr(self, 'rate_%d' % rate) for rate in RATE_RANGE]
+
+    @classmethod
+    def apply(cls, photographer_id, added=None, removed=None):
+        # Add and/or remove one rating on a photographer's stats row.
+        # The row is locked so concurrent reviews cannot lose updates.
+        with transaction.atomic():
+            if added is not None:
+                cls.objects.get_or_create(photographer_id=photographer_id)
+            stats = cls.objects.select_for_update().filter(photographer_id=photographer_id).first()
+            if stats is None:
+                # Photographer is being deleted along with its stats
+                return
+            if removed is not None:
+                stats.review_count -= 1
+                stats.review_sum -= removed
+                setattr(stats, 'rate_%d' % removed, getattr(stats, 'rate_%d' % removed) - 1)
+            if added is not None:
+                stats.review_count += 1
+                stats.review_sum += added
+                setattr(stats, 'rate_%d' % added, getattr(stats, 'rate_%d' % added) + 1)
+            stats.review_avg = stats.review_sum / stats.review_count if stats.review_count else None
+            stats.save()
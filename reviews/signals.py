@@ -0,0 +1,48 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from photographers.models import Photographer
+from jobs.models import JobInfo
+from .models import ReviewInfo, ReviewStats
+
+
+def _photographer_id(review):
+    return JobInfo.objects.filter(pk=review.reviewJob_id).values_list('job_photographer_id', flat=True).first()
+
+
+@receiver(post_save, sender=Photographer)
+def create_review_stats(sender, instance, created, raw=False, **kwargs):
+    # Every photographer gets a stats row so review sorts never hit NULLs
+    if created and not raw:
+        ReviewStats.objects.get_or_create(photographer=instance)
+
+
+@receiver(pre_save, sender=ReviewInfo)
+def remember_previous_review(sender, instance, raw=False, **kwargs):
+    # reviewJob is the primary key, so it is already set on create; look the old row up instead
+    instance._previous_review = ReviewInfo.objects.filter(pk=instance.pk) \
+        .values_list('rateJob', 'reviewJob__job_photographer_id').first()
+
+
+@receiver(post_save, sender=ReviewInfo)
+def update_review_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    photographer_id = _photographer_id(instance)
+    previous = getattr(instance, '_previous_review', None)
+    if previous is not None:
+        old_rate, old_photographer_id = previous
+        if old_photographer_id != photographer_id:
+            ReviewStats.apply(old_photographer_id, removed=old_rate)
+            ReviewStats.apply(photographer_id, added=instance.rateJob)
+        elif old_rate != instance.rateJob:
+            ReviewStats.apply(photographer_id, added=instance.rateJob, removed=old_rate)
+    else:
+        ReviewStats.apply(photographer_id, added=instance.rateJob)
+
+
+@receiver(post_delete, sender=ReviewInfo)
+def remove_review_stats(sender, instance, **kwargs):
+    photographer_id = _photographer_id(instance)
+    if photographer_id is not None:
+        ReviewStats.apply(photographer_id, removed=instance.rateJob)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from users.models import CustomUser
+from users.search import reindex_users, NAME_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the UserNameGram search index for every user, one chunk of users at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('pk').only('pk', *NAME_FIELDS)
+        last_pk = 0
+        total = 0
+        while True:
+            chunk = list(users.filter(pk__gt=last_pk)[:options['chunk_size']])
+            if not chunk:
+                break
+            reindex_users(chunk)
+            last_pk = chunk[-1].pk
+            total += len(chunk)
+            self.stdout.write('Indexed %d users' % total)
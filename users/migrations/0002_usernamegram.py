@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copy of users.search.name_grams as of this migration, so later
+# changes to the live helper do not change what the migration does
+MAX_GRAM = 3
+
+
+def name_grams(*names):
+    grams = set()
+    for name in names:
+        name = (name or '').lower()
+        for size in range(1, MAX_GRAM + 1):
+            grams.update(name[i:i + size] for i in range(len(name) - size + 1))
+    return grams
+
+
+def build_name_grams(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    UserNameGram = apps.get_model('users', 'UserNameGram')
+    batch = []
+    for user in CustomUser.objects.only('pk', 'username', 'first_name', 'last_name').iterator():
+        batch.extend(UserNameGram(user_id=user.pk, gram=gram)
+                     for gram in name_grams(user.username, user.first_name, user.last_name))
+        if len(batch) >= 5000:
+            UserNameGram.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    UserNameGram.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserNameGram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_grams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('gram', 'user')},
+            },
+        ),
+        migrations.RunPython(build_name_grams, migrations.RunPython.noop),
+    ]
@@ -31,3 +31,15 @@ class CustomUserProfile(models.Model):
         verbose_name = "Profile"
         verbose_name_plural = "Profiles"
 
+
+class UserNameGram(models.Model):
+    # Lower-cased 1-3 character substrings of a user's username, first and last name.
+    # Looking a gram up is an index seek, unlike a leading-wildcard LIKE (see users.search).
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='name_grams')
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = [('gram', 'user')]
+
+    def __str__(self):
+        return self.gram
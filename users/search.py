@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from .models import CustomUser, UserNameGram
+
+MAX_GRAM = 3
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def name_grams(*names):
+    # Every substring of length 1..MAX_GRAM, so short queries match a gram exactly
+    grams = set()
+    for name in names:
+        name = (name or '').lower()
+        for size in range(1, MAX_GRAM + 1):
+            grams.update(name[i:i + size] for i in range(len(name) - size + 1))
+    return grams
+
+
+def query_grams(query):
+    query = query.lower()
+    if len(query) <= MAX_GRAM:
+        return {query}
+    return {query[i:i + MAX_GRAM] for i in range(len(query) - MAX_GRAM + 1)}
+
+
+def reindex_users(users):
+    # Replace the grams of the given users with a delete and a single bulk insert
+    users = list(users)
+    with transaction.atomic():
+        UserNameGram.objects.filter(user__in=[user.pk for user in users]).delete()
+        UserNameGram.objects.bulk_create(
+            [UserNameGram(user_id=user.pk, gram=gram)
+             for user in users
+             for gram in name_grams(*(getattr(user, field) for field in NAME_FIELDS))],
+            # case-insensitive collations (MySQL) may fold distinct grams together
+            ignore_conflicts=True)
+
+
+def candidate_user_ids(query):
+    # Users having every gram of the query. Exact for queries up to MAX_GRAM characters,
+    # a superset of the substring matches for longer ones.
+    grams = query_grams(query)
+    return UserNameGram.objects.filter(gram__in=grams).values('user') \
+        .annotate(matched=Count('gram')).filter(matched=len(grams)).values('user')
+
+
+def search_users(queryset, query, user_path=''):
+    # Filter `queryset` to rows whose user (reached through `user_path`, e.g. 'profile__user__')
+    # has `query` in their username, first or last name, best matches first.
+    query = query.strip()
+    if not query:
+        return queryset
+    queryset = queryset.filter(**{user_path + 'id__in': candidate_user_ids(query)})
+    contains = Q()
+    exact = Q()
+    prefix = Q()
+    for field in NAME_FIELDS:
+        contains |= Q(**{user_path + field + '__icontains': query})
+        exact |= Q(**{user_path + field + '__iexact': query})
+        prefix |= Q(**{user_path + field + '__istartswith': query})
+    if len(query) > MAX_GRAM:
+        queryset = queryset.filter(contains)
+    return queryset.annotate(name_rank=Case(When(exact, then=Value(2)),
+                                            When(prefix, then=Value(1)),
+                                            default=Value(0),
+                                            output_field=IntegerField())).order_by('-name_rank')
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .search import reindex_users, NAME_FIELDS
+
+
+@receiver(post_save, sender=CustomUser)
+def update_name_grams(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # Saves that do not touch a name (e.g. last_login on sign in) leave the index alone
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(NAME_FIELDS):
+        return
+    reindex_users([instance])